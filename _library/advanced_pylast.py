@@ -4,6 +4,14 @@ import pylast as pl
 class advanced_pylast_User(pl.User):
     PERIOD_OVERALL = "overall"
 
+    def _top_artists_doc(self, period, limit, page):
+        params = self._get_params()
+        params["period"] = period
+        params["page"] = page
+        if limit:
+            params["limit"] = limit
+        return self._request(self.ws_prefix + ".getTopArtists", True, params)
+
     def get_top_artists(self, period=PERIOD_OVERALL, limit=None, page=1):
         """Returns the top artists played by a user.
         * period: The period of time. Possible values:
@@ -14,10 +22,57 @@ class advanced_pylast_User(pl.User):
           o PERIOD_6MONTHS
           o PERIOD_12MONTHS
         """
+        doc = self._top_artists_doc(period, limit, page)
+        return pl._extract_top_artists(doc, self.network)
+
+    def get_top_artist_playcounts(self, period=PERIOD_OVERALL, limit=None, page=1):
+        """Fast path for get_top_artists when only names and play counts are needed.
+
+        Reads the two fields straight off the response XML into parallel lists instead
+        of building a pylast Artist and TopItem per row, which dominates CPU time and
+        memory for libraries with tens of thousands of artists. Also returns the
+        totalPages attribute last.fm reports with every page, so a caller can plan the
+        rest of a crawl up front.
+
+        Returns:
+            ([str], [int], int): Artist names and their play counts in the order last.fm
+                                 ranks them (descending play count), and the total number of pages.
+        """
+        doc = self._top_artists_doc(period, limit, page)
+        top_artists = doc.getElementsByTagName("topartists")[0]
+        names, playcounts = [], []
+        for node in top_artists.getElementsByTagName("artist"):
+            names.append(pl._extract(node, "name"))
+            playcounts.append(int(pl._extract(node, "playcount")))
+        return names, playcounts, int(top_artists.getAttribute("totalPages") or 0)
+
+    def get_recent_artist_scrobbles(self, time_from, time_to=None, limit=200, page=1):
+        """Returns the artist name of every scrobble from time_from up to time_to, one page at a time.
+        Only the artist names are extracted - building full pylast PlayedTrack objects
+        would cost an extra object graph per scrobble for data nobody reads.
+
+        A track that's playing right now is reported by last.fm without being
+        scrobbled yet, so it's left out.
+
+        Args:
+            time_from (int): Unix timestamp; only scrobbles at or after it are returned.
+            time_to (int, optional): Unix timestamp; only scrobbles before it are returned.
+                Pass it when reading several pages, so scrobbles arriving meanwhile don't
+                shift the pages under the reader. Defaults to no end.
+            limit (int, optional): Scrobbles per page, at most 200. Defaults to 200.
+            page (int, optional): Which page to fetch. Defaults to 1.
+
+        Returns:
+            ([str], int): One artist name per scrobble on the page, and the total number of pages.
+        """
         params = self._get_params()
-        params["period"] = period
+        params["from"] = time_from
+        if time_to is not None:
+            params["to"] = time_to
+        params["limit"] = limit
         params["page"] = page
-        if limit:
-            params["limit"] = limit
-        doc = self._request(self.ws_prefix + ".getTopArtists", True, params)
-        return pl._extract_top_artists(doc, self.network)
+        doc = self._request(self.ws_prefix + ".getRecentTracks", False, params)
+        total_pages = doc.getElementsByTagName("recenttracks")[0].getAttribute("totalPages")
+        artists = [pl._extract(track, "artist") for track in doc.getElementsByTagName("track")
+                   if track.getAttribute("nowplaying") != "true"]
+        return artists, int(total_pages or 0)
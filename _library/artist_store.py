@@ -0,0 +1,132 @@
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+SAVED_ARTISTS_DB = 'saved_artists.db'
+
+
+class ArtistStore(MutableMapping):
+    """One music service's saved artists, {artist name: entry}, in an SQLite database
+    shared by every service - a drop-in for the dict saved_artists.json used to load
+    into, without loading it.
+
+    Entries are read one at a time, when first looked up, and kept in memory for the
+    rest of the run. Changes (anything assigned, e.g. through update()) are kept in
+    memory too, until save() upserts just those rows - the cost of a save no longer
+    grows with the size of the cache. Thread-safe.
+
+    Iterating or taking len() reads every name once, on first use, and keeps the set
+    up to date from then on. close() (or leaving a `with` block) closes the database.
+    """
+
+    def __init__(self, music_service, path=SAVED_ARTISTS_DB):
+        self.music_service = music_service
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS artists "
+                                 "(service TEXT NOT NULL, name TEXT NOT NULL, entry TEXT NOT NULL, "
+                                 "PRIMARY KEY (service, name))")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._connection.commit()
+        self._entries = {}
+        self._dirty = set()
+        self._names = None  # Every name, saved or not - loaded by _all_names.
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._entries:
+                row = self._connection.execute("SELECT entry FROM artists WHERE service = ? AND name = ?",
+                                               (self.music_service, name)).fetchone()
+                if row is None:
+                    raise KeyError(name)
+                self._entries[name] = json.loads(row[0])
+            return self._entries[name]
+
+    def __setitem__(self, name, entry):
+        with self._lock:
+            self._entries[name] = entry
+            self._dirty.add(name)
+            if self._names is not None:
+                self._names.add(name)
+
+    def __delitem__(self, name):
+        with self._lock:
+            deleted = self._connection.execute("DELETE FROM artists WHERE service = ? AND name = ?",
+                                               (self.music_service, name)).rowcount
+            self._connection.commit()
+            in_memory = self._entries.pop(name, None) is not None
+            self._dirty.discard(name)
+            if self._names is not None:
+                self._names.discard(name)
+            if not deleted and not in_memory:
+                raise KeyError(name)
+
+    def _all_names(self):
+        """Every name in the store. Call with self._lock held."""
+        if self._names is None:
+            rows = self._connection.execute("SELECT name FROM artists WHERE service = ?", (self.music_service,))
+            self._names = {name for name, in rows} | self._dirty
+        return self._names
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._all_names()))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._all_names())
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def save(self):
+        """Writes every entry changed since the last save, in one transaction."""
+        with self._lock:
+            rows = [(self.music_service, name, json.dumps(self._entries[name])) for name in self._dirty]
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO artists (service, name, entry) VALUES (?, ?, ?)",
+                                             rows)
+            self._dirty.clear()
+        return True
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_service(self, music_service, entries):
+        """Writes another service's whole {artist name: entry} straight to the database,
+        leaving entries already there untouched. Used by the one-time migration from
+        saved_artists.json, see file_handler.get_saved_artists.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO artists (service, name, entry) VALUES (?, ?, ?)",
+                                         [(music_service, name, json.dumps(entry)) for name, entry in entries.items()])
+            if self._names is not None and music_service == self.music_service:
+                self._names.update(entries)
+
+    @property
+    def closed(self):
+        return self._connection is None
+
+    def close(self):
+        """Closes the database. Changes not saved yet are lost."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
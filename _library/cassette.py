@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import random
+import time
+
+import pylast as pl
+
+# Values for general_settings.offline_mode.
+OFFLINE_OFF = 0
+OFFLINE_RECORD = 1  # Run live, saving every response to the cassette directory.
+OFFLINE_REPLAY = 2  # Run with no network at all, serving the saved responses.
+
+CASSETTE_DIRECTORY = 'cassettes'
+
+# Request parameters that differ between otherwise identical last.fm requests (the
+# signature changes with the session key, which changes with every login), so they
+# are left out of a request's cassette key.
+_VOLATILE_LASTFM_PARAMS = {'api_sig', 'sk', 'api_key'}
+
+
+class Cassette:
+    """A directory of recorded API responses, one JSON file per distinct request,
+    grouped by namespace (e.g. 'lastfm', or a music service's name).
+
+    When replaying, every call first waits latency_ms and then fails with
+    probability error_percent - see simulate_call - so runs can be timed against
+    realistic (and reproducible, given the same seed) API behavior.
+
+    Note: recorded last.fm responses include the session key from logging in.
+    Treat a cassette directory like the auth_*.json files.
+    """
+
+    def __init__(self, directory=CASSETTE_DIRECTORY, latency_ms=0, error_percent=0, seed=None):
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.error_percent = error_percent
+        self._random = random.Random(seed)
+
+    def _path(self, namespace, request):
+        key = hashlib.sha1(json.dumps(request, sort_keys=True).encode('UTF-8')).hexdigest()
+        return os.path.join(self.directory, namespace, f"{key}.json")
+
+    def save(self, namespace, request, response):
+        """Records `response` (anything JSON-serializable) as the answer to `request`."""
+        path = self._path(namespace, request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='UTF-8') as file:
+            json.dump({'request': request, 'response': response}, file)
+        return True
+
+    def load(self, namespace, request):
+        """Returns the recorded answer to `request`, or None if it was never recorded."""
+        try:
+            with open(self._path(namespace, request), 'r', encoding='UTF-8') as file:
+                return json.load(file)['response']
+        except FileNotFoundError:
+            return None
+
+    def simulate_call(self):
+        """Sleeps the simulated latency, then returns True if this call should fail."""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._random.uniform(0, 100) < self.error_percent
+
+
+def _lastfm_request_key(params):
+    return {name: str(value) for name, value in params.items() if name not in _VOLATILE_LASTFM_PARAMS}
+
+
+def install_pylast_cassette(cassette, mode):
+    """Routes every pylast request through `cassette`, underneath pylast's own response
+    parsing: OFFLINE_RECORD saves each response body, OFFLINE_REPLAY serves them
+    without touching the network. Must run before the LastFMNetwork is created, since
+    logging in is itself a request.
+
+    In replay, a simulated failure surfaces as the same WSError an HTTP 500 from last.fm
+    does, and a request that was never recorded as a NetworkError.
+    """
+    download_response = pl._Request._download_response
+
+    def recording_download_response(request):
+        response = download_response(request)
+        cassette.save('lastfm', _lastfm_request_key(request.params), response)
+        return response
+
+    def replaying_download_response(request):
+        if cassette.simulate_call():
+            raise pl.WSError(request.network, 500, "Connection to the API failed with HTTP code 500")
+        response = cassette.load('lastfm', _lastfm_request_key(request.params))
+        if response is None:
+            raise pl.NetworkError(request.network, "No recorded response for this request.")
+        return response
+
+    if mode == OFFLINE_RECORD:
+        pl._Request._download_response = recording_download_response
+    elif mode == OFFLINE_REPLAY:
+        pl._Request._download_response = replaying_download_response
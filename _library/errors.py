@@ -31,3 +31,16 @@ class SearchError(PlayListError):
         self.artist = artist
         self.message = f"Could not complete search for artist: {self.artist}."
         super().__init__(self.message)
+
+
+class OutOfTimeError(PlayListError):
+    def __init__(self):
+        self.message = "Out of time (max_runtime_seconds)."
+        super().__init__(self.message)
+
+
+class LastfmUnavailableError(PlayListError):
+    def __init__(self, reason):
+        self.reason = reason
+        self.message = f"last.fm is unavailable: {self.reason}"
+        super().__init__(self.message)
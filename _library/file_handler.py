@@ -1,12 +1,41 @@
+import os
+
 import yaml
 import json
 
+from _library.artist_store import ArtistStore, SAVED_ARTISTS_DB
 from _library.music_services import MUSIC_SERVICES, DEFAULT_MUSIC_SERVICE
 
 # Valid values for general_settings.genre_source.
 # None disables genre checking entirely, avoiding any related API calls.
 GENRE_SOURCES = [None, 'Spotify', 'LastFM']
 
+# Valid values for general_settings.offline_mode: 0 runs live, 1 runs live while
+# recording every response to cassettes/, 2 replays those with no network at all.
+OFFLINE_MODES = [0, 1, 2]
+
+# Request budgets, in requests per second. Unlike every other numeric setting these
+# may be fractional - 0.5 is one request every two seconds.
+RATE_SETTINGS = ['lastfm_requests_per_second', 'music_service_requests_per_second',
+                 'music_service_max_requests_per_second']
+
+# Where the stores below (saved artists, the caches, failed/no-song artists, scrobble
+# snapshots and the run journal) are kept: the working directory, unless
+# set_store_directory says otherwise. config.yaml, credentials and the txt lists
+# always stay in the working directory.
+_store_directory = ''
+
+
+def set_store_directory(directory):
+    """Keeps every store under `directory` from now on - '' for the working directory."""
+    global _store_directory
+    _store_directory = directory
+
+
+def store_path(filename):
+    """Where the store called `filename` is kept, see set_store_directory."""
+    return os.path.join(_store_directory, filename)
+
 
 # YAML Getters
 def read_yaml(filename):
@@ -31,11 +60,11 @@ def _read_service_nested_yaml(filename):
 
 
 def get_failed_artists(music_service=DEFAULT_MUSIC_SERVICE):
-    return _read_service_nested_yaml('failed_artists.yaml').get(music_service, {})
+    return _read_service_nested_yaml(store_path('failed_artists.yaml')).get(music_service, {})
 
 
 def get_no_song_artists(music_service=DEFAULT_MUSIC_SERVICE):
-    return _read_service_nested_yaml('no_song_artists.yaml').get(music_service, {})
+    return _read_service_nested_yaml(store_path('no_song_artists.yaml')).get(music_service, {})
 
 
 def get_config():
@@ -48,9 +77,49 @@ def get_config():
             general.setdefault('genre_source', None)
             general.setdefault('music_service', DEFAULT_MUSIC_SERVICE)
             general.setdefault('own_scrobbles_cache_hours', 8)
-            if 'sleep_time_Spotify' in general and 'sleep_time_music_service' not in general:
-                general['sleep_time_music_service'] = general.pop('sleep_time_Spotify')
-            general.setdefault('sleep_time_music_service', 2)
+            general.setdefault('own_scrobbles_full_refresh_hours', 168)
+            general.setdefault('lastfm_workers', 4)
+            general.setdefault('lastfm_max_attempts', 5)
+            general.setdefault('lastfm_circuit_breaker_failures', 10)
+            # The fixed sleep_time_* pauses after every call were replaced by per-host
+            # request budgets (see _library/rate_limiter.py). Carry a configured pause
+            # over as the same rate, and as the most the music service budget may
+            # speed up to, so an upgrade never paces calls faster than before. 0 meant
+            # "don't wait at all".
+            old_sleep = general.pop('sleep_time_music_service', general.pop('sleep_time_Spotify', None))
+            if old_sleep is not None and 'music_service_requests_per_second' not in general:
+                general['music_service_requests_per_second'] = 1 / old_sleep if old_sleep else 10
+                general.setdefault('music_service_max_requests_per_second',
+                                   general['music_service_requests_per_second'])
+            old_sleep = general.pop('sleep_time_Lastfm', None)
+            if old_sleep is not None and 'lastfm_requests_per_second' not in general:
+                general['lastfm_requests_per_second'] = 1 / old_sleep if old_sleep else 10
+            general.setdefault('lastfm_requests_per_second', 4)
+            general.setdefault('music_service_requests_per_second', 0.5)
+            general.setdefault('music_service_max_requests_per_second', 10)
+            general.setdefault('rate_limit_burst', 4)
+            general.setdefault('track_id_lookahead', 4)
+            # An artist missing from the caches is searched under its name as is, and every
+            # result is checked against all of its spellings at once. Another spelling is only
+            # searched after a near miss - no match, but a result at least this similar (in
+            # percent) - so an artist the service doesn't know costs one search. Before, every
+            # spelling was searched in turn until one matched; 0 brings that back, 100 never
+            # searches a second spelling.
+            general.setdefault('search_near_miss_percent', 80)
+            general.setdefault('max_runtime_seconds', 0)
+            general.setdefault('lastfm_tag_prefetch_artists', 200)
+            general.setdefault('search_cache_days', 30)
+            general.setdefault('search_cache_negative_days', 7)
+            general.setdefault('search_cache_max_entries', 20000)
+            general.setdefault('album_cache_max_entries', 20000)
+            general.setdefault('journal_compact_every', 100)
+            general.setdefault('saved_artist_ttl_days', 90)
+            # How many saved artists (not requests) are refreshed in the background per run -
+            # one can take a single request or a whole discography's worth.
+            general.setdefault('artist_refreshes_per_run', 50)
+            general.setdefault('offline_mode', 0)
+            general.setdefault('offline_latency_ms', 0)
+            general.setdefault('offline_error_percent', 0)
             # genres used to live under general_settings and applied to both farm and
             # steal. Migrate it into each section that doesn't already have its own.
             old_genres = general.pop('genres', None)
@@ -58,6 +127,9 @@ def get_config():
             settings['stealing_settings'].setdefault('genres', old_genres if old_genres is not None else [])
             settings['farming_settings'].setdefault('max_songs_per_artist', 10)
             settings['stealing_settings'].setdefault('max_songs_per_artist', 10)
+            # Opponent reuse is now tracked per opponent inside opponent_scrobbles.json.
+            settings['stealing_settings'].pop('last_opponent_save', None)
+            settings['stealing_settings'].pop('saved_opponent_goal', None)
             verify_config(settings)
     except FileNotFoundError:
         settings = generate_settings()
@@ -90,6 +162,17 @@ def verify_config(settings):
                         f"Error in config.yaml, {setting_set}, {setting}. "
                         f"Value should be one of {list(MUSIC_SERVICES.keys())}."
                     )
+            elif setting in RATE_SETTINGS:
+                value = settings[setting_set][setting]
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    raise ValueError(
+                        f"Error in config.yaml, {setting_set}, {setting}. Value should be a number over 0."
+                    )
+            elif setting == 'offline_mode':
+                if settings[setting_set]['offline_mode'] not in OFFLINE_MODES:
+                    raise ValueError(
+                        f"Error in config.yaml, {setting_set}, {setting}. Value should be one of {OFFLINE_MODES}."
+                    )
             else:
                 if not isinstance(settings[setting_set][setting], int):
                     raise ValueError(f"Error in config.yaml, {setting_set}, {setting}. Value should be an integer.")
@@ -103,24 +186,44 @@ def write_yaml(filename, dumpfile):
 
 
 def save_failed_artists(failed_artists, music_service=DEFAULT_MUSIC_SERVICE):
-    all_failed = _read_service_nested_yaml('failed_artists.yaml')
+    all_failed = _read_service_nested_yaml(store_path('failed_artists.yaml'))
     all_failed[music_service] = failed_artists
-    return write_yaml('failed_artists.yaml', all_failed)
+    return write_yaml(store_path('failed_artists.yaml'), all_failed)
 
 
 def save_no_song_artists(no_song_artists, music_service=DEFAULT_MUSIC_SERVICE):
-    all_no_song = _read_service_nested_yaml('no_song_artists.yaml')
+    all_no_song = _read_service_nested_yaml(store_path('no_song_artists.yaml'))
     all_no_song[music_service] = no_song_artists
-    return write_yaml('no_song_artists.yaml', all_no_song)
+    return write_yaml(store_path('no_song_artists.yaml'), all_no_song)
 
 
 def generate_settings():
     settings = {'general_settings': {'verbose': 1,
-                                     'sleep_time_music_service': 2,
-                                     'sleep_time_Lastfm': 2,
+                                     'music_service_requests_per_second': 0.5,
+                                     'music_service_max_requests_per_second': 10,
+                                     'rate_limit_burst': 4,
+                                     'track_id_lookahead': 4,
+                                     'search_near_miss_percent': 80,
+                                     'max_runtime_seconds': 0,
+                                     'lastfm_tag_prefetch_artists': 200,
+                                     'search_cache_days': 30,
+                                     'search_cache_negative_days': 7,
+                                     'search_cache_max_entries': 20000,
+                                     'album_cache_max_entries': 20000,
+                                     'journal_compact_every': 100,
+                                     'saved_artist_ttl_days': 90,
+                                     'artist_refreshes_per_run': 50,
+                                     'offline_mode': 0,
+                                     'offline_latency_ms': 0,
+                                     'offline_error_percent': 0,
                                      'genre_source': None,
                                      'music_service': DEFAULT_MUSIC_SERVICE,
                                      'own_scrobbles_cache_hours': 8,
+                                     'own_scrobbles_full_refresh_hours': 168,
+                                     'lastfm_workers': 4,
+                                     'lastfm_requests_per_second': 4,
+                                     'lastfm_max_attempts': 5,
+                                     'lastfm_circuit_breaker_failures': 10,
                                      'popular': 1},
                 'farming_settings': {'active': 1,
                                      'crown_goal': 30,
@@ -132,13 +235,11 @@ def generate_settings():
                 'stealing_settings': {'active': 1,
                                       'crown_goal': 30,
                                       'genres': [],
-                                      'last_opponent_save': 0,
                                       'last_run': 0,
                                       'max_songs_per_artist': 10,
                                       'overtake': 0,
                                       'playlist_length': 100,
-                                      'reuse': 7,
-                                      'saved_opponent_goal': 30}}
+                                      'reuse': 7}}
     return settings
 
 
@@ -166,9 +267,28 @@ def _read_service_nested_json(filename):
     return data
 
 
+# The ArtistStore opened for each (music service, database path), see get_saved_artists.
+_artist_stores = {}
+
+
 def get_saved_artists(music_service=DEFAULT_MUSIC_SERVICE):
-    all_saved = _read_service_nested_json('saved_artists.json')
-    return _migrate_saved_artists(all_saved.get(music_service, {}))
+    """Returns the service's saved artists as an ArtistStore (see _library/artist_store.py).
+    Every call gets the same store, until it's closed.
+
+    The first time this runs, every service's artists in a saved_artists.json (or the
+    older saved_artists.yaml) are copied into the database. The old file is left in
+    place, unused from then on.
+    """
+    key = (music_service, store_path(SAVED_ARTISTS_DB))
+    store = _artist_stores.get(key)
+    if store is not None and not store.closed:
+        return store
+    store = _artist_stores[key] = ArtistStore(music_service, key[1])
+    if store.get_meta('json_migrated') is None:
+        for service, saved_art in _read_service_nested_json(store_path('saved_artists.json')).items():
+            store.import_service(service, _migrate_saved_artists(saved_art))
+        store.set_meta('json_migrated', '1')
+    return store
 
 
 def _migrate_saved_artists(saved_art):
@@ -187,9 +307,58 @@ def _migrate_saved_artists(saved_art):
 
 
 def save_artist_info(artist_info, music_service=DEFAULT_MUSIC_SERVICE):
-    all_saved = _read_service_nested_json('saved_artists.json')
-    all_saved[music_service] = artist_info
-    return write_json('saved_artists.json', all_saved)
+    """Saves the changed entries of an ArtistStore, or every entry of a plain dict (through
+    the service's store, see get_saved_artists).
+    """
+    if not isinstance(artist_info, ArtistStore):
+        store = get_saved_artists(music_service)
+        store.update(artist_info)
+        artist_info = store
+    return artist_info.save()
+
+
+# Artist index
+# Every artist any search_artist call has returned on a given music service, keyed
+# by cleaned name (see Playlist_Generator.clean_string) - most search results are
+# not the artist being looked up, but many are artists that will be looked up later.
+def get_artist_index(music_service=DEFAULT_MUSIC_SERVICE):
+    """Returns {cleaned name: {'id': str, 'name': str, 'genres': [str], 'confirmed': bool, 'rank': int}}
+    for the given service, see Playlist_Generator.add_to_artist_index. Entries saved before
+    'confirmed' and 'rank' were recorded lack them, and count as unconfirmed and ranked last.
+    """
+    return (_read_json_or_none(store_path('artist_index.json')) or {}).get(music_service, {})
+
+
+def save_artist_index(artist_index, music_service=DEFAULT_MUSIC_SERVICE):
+    all_indexes = _read_json_or_none(store_path('artist_index.json')) or {}
+    all_indexes[music_service] = artist_index
+    return write_json(store_path('artist_index.json'), all_indexes)
+
+
+# Search cache
+# How each artist name resolved per music service, see SearchCache in
+# _library/music_services/base.py for the format and expiry rules.
+def get_search_cache(music_service=DEFAULT_MUSIC_SERVICE):
+    return (_read_json_or_none(store_path('search_cache.json')) or {}).get(music_service, {})
+
+
+def save_search_cache(search_cache, music_service=DEFAULT_MUSIC_SERVICE):
+    all_caches = _read_json_or_none(store_path('search_cache.json')) or {}
+    all_caches[music_service] = search_cache
+    return write_json(store_path('search_cache.json'), all_caches)
+
+
+# Album cache
+# Album track lists per music service, see AlbumCache in
+# _library/music_services/base.py for the format.
+def get_album_cache(music_service=DEFAULT_MUSIC_SERVICE):
+    return (_read_json_or_none(store_path('album_cache.json')) or {}).get(music_service, {})
+
+
+def save_album_cache(album_cache, music_service=DEFAULT_MUSIC_SERVICE):
+    all_caches = _read_json_or_none(store_path('album_cache.json')) or {}
+    all_caches[music_service] = album_cache
+    return write_json(store_path('album_cache.json'), all_caches)
 
 
 def write_json(filename, dumpfile):
@@ -206,14 +375,45 @@ def write_json(filename, dumpfile):
 # nested by music_service: this is pure last.fm data, independent of which
 # music_service is active.
 def get_own_scrobbles_cache():
-    """Returns the cached {'timestamp': <unix seconds>, 'data': {artist: scrobbles}}
-    snapshot, or None if there isn't one yet.
+    """Returns the cached {'timestamp': <unix seconds>, 'full_timestamp': <unix seconds>,
+    'data': {artist: scrobbles}} snapshot, or None if there isn't one yet.
+
+    'timestamp' is when the data was last brought up to date, 'full_timestamp' when
+    it was last crawled in full. Snapshots written before incremental refreshes
+    existed have no 'full_timestamp' - for those the two are the same.
     """
-    return _read_json_or_none('own_scrobbles_cache.json')
+    return _read_json_or_none(store_path('own_scrobbles_cache.json'))
+
+
+def save_own_scrobbles_cache(timestamp, data, full_timestamp=None):
+    """Saves a snapshot. Leave full_timestamp out when data is a fresh full crawl."""
+    if full_timestamp is None:
+        full_timestamp = timestamp
+    return write_json(store_path('own_scrobbles_cache.json'),
+                      {'timestamp': timestamp, 'full_timestamp': full_timestamp, 'data': data})
+
+
+# Opponent snapshots
+# One cached top-artists snapshot per opponent in opponent_list.txt, each with
+# its own fetch time and the crown_goal it was fetched for, so adding an opponent
+# or one going stale only costs that opponent's re-download - see
+# Playlist_Generator.refresh_opponent_snapshots. Pure last.fm data, so like the
+# own-scrobbles cache it isn't nested by music_service.
+def get_opponent_snapshots():
+    """Returns {opponent: {'timestamp': <unix seconds>, 'crown_goal': int, 'data': {artist: scrobbles}}}.
+
+    An older opponent_scrobbles.json holds a single merged {artist: scrobbles} dict
+    with no record of which opponent each count came from, so it can't be split
+    into snapshots - it's ignored and every opponent is fetched once.
+    """
+    data = _read_json_or_none(store_path('opponent_scrobbles.json')) or {}
+    if not all(isinstance(snapshot, dict) for snapshot in data.values()):
+        return {}
+    return data
 
 
-def save_own_scrobbles_cache(timestamp, data):
-    return write_json('own_scrobbles_cache.json', {'timestamp': timestamp, 'data': data})
+def save_opponent_snapshots(snapshots):
+    return write_json(store_path('opponent_scrobbles.json'), snapshots)
 
 
 # Credentials
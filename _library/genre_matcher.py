@@ -0,0 +1,36 @@
+import hashlib
+import json
+import re
+
+
+class GenreMatcher:
+    """A farming_settings/stealing_settings genres list, compiled once for matching
+    against artist genres: a genre starting with '+' must equal an artist's genre
+    (the '+' included - it's how '+ NO GENRE +' is asked for), any other genre must
+    appear somewhere in it. Case-insensitive, like check_genres always was.
+
+    The '+' genres become a set lookup and the rest a single regex alternation, so
+    matching an artist costs one pass over its genres, however many are wanted.
+    """
+
+    def __init__(self, genres, genre_source=None):
+        """
+        Args:
+            genres ([str]): The wanted genres.
+            genre_source (str, optional): general_settings.genre_source, part of `key`.
+        """
+        self.genres = genres
+        self.exact = {genre.lower() for genre in genres if genre.startswith('+')}
+        partial = {genre.lower() for genre in genres if not genre.startswith('+')}
+        self.pattern = re.compile('|'.join(re.escape(genre) for genre in sorted(partial))) if partial else None
+        # Identifies what a cached match result was computed against, see
+        # Playlist_Generator.artist_matches_genres.
+        self.key = hashlib.sha1(json.dumps([genre_source, sorted(set(genres))]).encode('UTF-8')).hexdigest()[:16]
+
+    def matches(self, artist_genres):
+        """Whether any of `artist_genres` is wanted."""
+        for genre in artist_genres:
+            genre = genre.lower()
+            if genre in self.exact or (self.pattern is not None and self.pattern.search(genre)):
+                return True
+        return False
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+
+def journal_filename(music_service, kind=None):
+    if kind is None:
+        return f"journal_{music_service.lower()}.jsonl"
+    return f"journal_{music_service.lower()}_{kind}.jsonl"
+
+
+class RunJournal:
+    """An append-only log of what a run has resolved so far, one JSON record per line,
+    each flushed to disk before append() returns - so a killed process or a power cut
+    loses at most the artist being looked up at the time.
+
+    The journal only has to cover what isn't in the main stores yet. To save them
+    while other threads keep appending, rotate() first sets the records so far aside in
+    a file of their own, and once the stores are saved discard_rotated() deletes just
+    that file (see Playlist_Generator.checkpoint). A journal that isn't empty at startup
+    is what an interrupted run left behind. Thread-safe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rotated_path = path + '.rotated'
+        self._file = None
+        self._lock = threading.Lock()
+        self.length = len(self.read())
+
+    def read(self):
+        """Returns every record in the journal, rotated ones included, oldest first. A
+        last line cut short by a crash mid-write is ignored.
+        """
+        return self._read(self.rotated_path) + self._read(self.path)
+
+    @staticmethod
+    def _read(path):
+        records = []
+        try:
+            with open(path, 'r', encoding='UTF-8') as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def append(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='UTF-8')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.length += 1
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rotate(self):
+        """Sets every record appended so far aside, so the journal starts over empty. A
+        rotated file discard_rotated() never got to is added to, not replaced.
+        """
+        with self._lock:
+            self._close()
+            if os.path.exists(self.rotated_path):
+                records = self._read(self.path)
+                with open(self.rotated_path, 'a', encoding='UTF-8') as file:
+                    file.writelines(json.dumps(record) + '\n' for record in records)
+                    file.flush()
+                    os.fsync(file.fileno())
+                self._remove(self.path)
+            elif os.path.exists(self.path):
+                os.replace(self.path, self.rotated_path)
+            self.length = 0
+
+    def discard_rotated(self):
+        """Deletes the records rotate() set aside, once they're safely in the stores."""
+        with self._lock:
+            self._remove(self.rotated_path)
+
+    def clear(self):
+        with self._lock:
+            self._close()
+            self._remove(self.rotated_path)
+            self._remove(self.path)
+            self.length = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
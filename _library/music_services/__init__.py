@@ -8,9 +8,11 @@ To add a new service:
 That's the whole integration point - config validation, credential prompts, and caching
 are all driven off this registry, not hardcoded to any particular service.
 """
-from .base import MusicService, ArtistResult, Track
+from .base import MusicService, SearchCache, AlbumCache, ArtistResult, Track
 from .spotify_service import SpotifyService
 from .tidal_service import TidalService
+# Offline stand-ins (general_settings.offline_mode), deliberately not registered below.
+from .fake_service import FakeMusicService, RecordingMusicService
 
 MUSIC_SERVICES = {
     'Spotify': SpotifyService,
@@ -1,7 +1,42 @@
+import bisect
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import List
 
+from _library.rate_limiter import RateLimiter
+
+# The longest Retry-After (seconds) a music service call waits out. A service asking
+# for more is treated as unavailable: the call fails instead of stalling the run.
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+def _is_throttling_status(status):
+    """Whether an HTTP status means "slow down": 429, or any 5xx server error."""
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, or None if it's missing. The
+    HTTP-date form is treated as missing - no music service API sends it.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_details(error):
+    """The HTTP status and Retry-After (seconds) of a failed call's exception, as spotipy's
+    SpotifyException or requests' HTTPError carry them - either None if it has none.
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'http_status', None) or getattr(response, 'status_code', None)
+    headers = getattr(error, 'headers', None) or getattr(response, 'headers', None) or {}
+    return status, _parse_retry_after(headers.get('Retry-After'))
+
 
 @dataclass(frozen=True)
 class ArtistResult:
@@ -36,6 +71,140 @@ class Track:
     duration_ms: int
 
 
+class SearchCache:
+    """How each artist name resolved on one music service, keyed by normalized name, so
+    looking the same artist up again costs no search. Used by Playlist_Generator.resolve_artist.
+
+    Only the outcome is kept - the matched artist and the spelling it matched, or None
+    if no search found it (ArtistNotFoundError), a negative result - not the searches'
+    results. Negative results expire after negative_ttl and matches after positive_ttl,
+    so artists that weren't found get retried on a schedule instead of never or every
+    run. A search that failed (SearchError) has no outcome and isn't cached. At most
+    max_entries names are kept, the least recently used being evicted first. Thread-safe.
+
+    Persisted through to_dict()/the `entries` constructor argument, as
+    {name: {'timestamp': <unix seconds>, 'match': [id, name, [genre, ...], search_name] or None}}
+    in least- to most-recently-used order.
+    """
+
+    def __init__(self, entries=None, positive_ttl=30 * 86400, negative_ttl=7 * 86400, max_entries=20000):
+        """
+        Args:
+            entries (dict, optional): A previous to_dict(). Defaults to an empty cache.
+            positive_ttl (float, optional): Seconds a match stays valid. Defaults to 30 days.
+            negative_ttl (float, optional): Seconds a negative result stays valid. Defaults to 7 days.
+            max_entries (int, optional): Most names kept. Defaults to 20000.
+        """
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_entries)
+        # Entries saved when this cached raw search results have no 'match', and are dropped.
+        self._entries = OrderedDict((key, entry) for key, entry in (entries or {}).items() if 'match' in entry)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def normalize(artist_name):
+        return ' '.join(artist_name.casefold().split())
+
+    def get(self, artist_name):
+        """Returns (ArtistResult, search_name) for a cached match, (None, None) for a cached
+        negative result, or None if there's no unexpired entry.
+        """
+        key = self.normalize(artist_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ttl = self.positive_ttl if entry['match'] is not None else self.negative_ttl
+            if time.time() - entry['timestamp'] >= ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            if entry['match'] is None:
+                return None, None
+            artist_id, name, genres, search_name = entry['match']
+            return ArtistResult(id=artist_id, name=name, genres=genres), search_name
+
+    def put(self, artist_name, match=None, search_name=None):
+        """Caches how artist_name resolved: the matched ArtistResult and the spelling it
+        matched, or no match at all for a negative result.
+        """
+        key = self.normalize(artist_name)
+        with self._lock:
+            self._entries[key] = {'timestamp': int(time.time()),
+                                  'match': None if match is None else [match.id, match.name, list(match.genres),
+                                                                       search_name]}
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._entries)
+
+
+class AlbumCache:
+    """Album track lists for one music service, keyed by album id, so an album seen
+    through one artist's discography (a compilation, a split, a feature) costs no
+    request when another artist's discography includes it too, or when an artist's
+    track list is rebuilt. Used by the services' iter_artist_discography.
+
+    A released album's track list doesn't change, so entries never expire. At most
+    max_entries albums are kept, the least recently used being evicted first.
+    Thread-safe.
+
+    Persisted through to_dict()/the `entries` constructor argument, as
+    {album id: [[id, name, artist_name, duration_ms], ...]} in least- to
+    most-recently-used order.
+    """
+
+    def __init__(self, entries=None, max_entries=20000):
+        """
+        Args:
+            entries (dict, optional): A previous to_dict(). Defaults to an empty cache.
+            max_entries (int, optional): Most albums kept. Defaults to 20000.
+        """
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict(entries or {})
+        self._lock = threading.Lock()
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, album_id):
+        with self._lock:
+            return album_id in self._entries
+
+    def get(self, album_id):
+        """Returns the cached [Track] for album_id, or None if it isn't cached."""
+        with self._lock:
+            tracks = self._entries.get(album_id)
+            if tracks is None:
+                return None
+            self._entries.move_to_end(album_id)
+            return [Track(*track) for track in tracks]
+
+    def put(self, album_id, tracks):
+        """Caches an album's [Track]."""
+        with self._lock:
+            self._entries[album_id] = [[track.id, track.name, track.artist_name, track.duration_ms]
+                                       for track in tracks]
+            self._entries.move_to_end(album_id)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._entries)
+
+
 class MusicService(ABC):
     """Common interface a music-playback backend must implement so Playlist_Generator
     can drive playlist creation without knowing which service is behind it.
@@ -57,17 +226,28 @@ class MusicService(ABC):
     #: authenticate with this service. E.g. Spotify needs a client id/secret.
     EXTRA_CREDENTIAL_KEYS = []
 
-    def __init__(self, credentials, sleep_time=0, verbose=False, error_logger=None):
+    #: The host this service's API calls go to - the key its request budget is
+    #: registered under in the shared RateLimiter (see _library/rate_limiter.py).
+    API_HOST = None
+
+    #: How many times _call retries a throttled, server-failed or network-failed call.
+    MAX_RETRIES = 5
+
+    def __init__(self, credentials, rate_limiter=None, verbose=False, error_logger=None, album_cache=None):
         """
         Args:
             credentials (dict): This service's credentials, keyed by required_credential_keys().
-            sleep_time (int, optional): Seconds to sleep between API calls. Defaults to 0.
+            rate_limiter (RateLimiter, optional): Shared per-host request budget; every API call
+                waits on it for API_HOST first. Defaults to an unconfigured (unlimited) one.
+            album_cache (AlbumCache, optional): Where iter_artist_discography caches album track
+                lists. Defaults to an empty in-memory one.
             verbose (bool, optional): Whether to print progress messages. Defaults to False.
             error_logger (callable, optional): error_logger(message, printflag=True) used to
                 record/print recoverable errors. Defaults to a plain print().
         """
         self.credentials = credentials
-        self.sleep_time = sleep_time
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.album_cache = album_cache or AlbumCache()
         self.verbose = verbose
         self.error_logger = error_logger or (lambda message, printflag=True: print(message))
 
@@ -76,16 +256,67 @@ class MusicService(ABC):
         """All credential keys needed to use this service, playlist ids included."""
         return ['FARMING_PLAYLIST_ID', 'STEALING_PLAYLIST_ID'] + cls.EXTRA_CREDENTIAL_KEYS
 
+    def _wait_for_rate_limit(self):
+        """Blocks until the next API call fits within this service's request budget."""
+        self.rate_limiter.acquire(self.API_HOST)
+
+    def _call(self, request, *args, **kwargs):
+        """Makes one API call within this service's request budget, and retries it if
+        the service throttled it (HTTP 429), failed server-side (5xx) or couldn't be
+        reached at all (a network error, with no status) - by then the budget has been
+        slowed down and, given a Retry-After, holds every call back for exactly that
+        long. This is the only place service calls are retried.
+
+        Any other error is raised as is, and so is one whose Retry-After is over
+        MAX_RETRY_AFTER_SECONDS, without waiting for it.
+        """
+        for attempt in range(self.MAX_RETRIES + 1):
+            self._wait_for_rate_limit()
+            try:
+                return request(*args, **kwargs)
+            except Exception as e:
+                status, retry_after = _error_details(e)
+                if status is None and isinstance(e, OSError):
+                    self.rate_limiter.report_throttled(self.API_HOST)
+                elif not _is_throttling_status(status):
+                    raise
+                if attempt == self.MAX_RETRIES or (retry_after or 0) > MAX_RETRY_AFTER_SECONDS:
+                    raise
+
+    def _observe_response(self, response, *args, **kwargs):
+        """requests response hook, to be installed on the session the service's client
+        library uses: feeds every response's status and Retry-After into the adaptive
+        request budget for API_HOST, and logs each slowdown with the resulting rate.
+        A Retry-After over MAX_RETRY_AFTER_SECONDS still slows the budget down, but
+        doesn't hold calls back - _call gives up on that call instead.
+        """
+        if _is_throttling_status(response.status_code):
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER_SECONDS:
+                self.rate_limiter.report_throttled(self.API_HOST)
+            else:
+                self.rate_limiter.report_throttled(self.API_HOST, retry_after)
+            message = f"{self.API_HOST} answered HTTP {response.status_code}"
+            if retry_after is not None:
+                message += f" with Retry-After {retry_after:g}s"
+            message += f", slowing down to {self.rate_limiter.rate(self.API_HOST) or 0:.2f} requests/s."
+            self.error_logger(message, bool(self.verbose))
+        elif response.status_code < 400:
+            self.rate_limiter.report_success(self.API_HOST)
+        return response
+
     @abstractmethod
-    def search_artist(self, artist_name, max_retries=1):
-        """Searches for an artist by name.
+    def search_artist(self, artist_name):
+        """Searches for an artist by name, with a single request - see _call for retries.
 
         Args:
             artist_name (str): The name to search for.
-            max_retries (int, optional): How many times to retry on error. Defaults to 1.
 
         Returns:
             [ArtistResult]: Candidate matches.
+
+        Raises:
+            SearchError: If the search failed.
         """
 
     @abstractmethod
@@ -110,6 +341,23 @@ class MusicService(ABC):
             [Track]
         """
 
+    def iter_artist_discography(self, artist_id):
+        """Yields an artist's discography one release at a time, shortest release types
+        (singles and EPs) first, fetching as it goes - so a caller that only needs a few
+        short tracks can stop early and skip most of the requests get_artist_all_tracks
+        makes.
+
+        This default fetches everything up front through get_artist_all_tracks and yields
+        it as a single release. Services that can page through releases should override it.
+
+        Args:
+            artist_id (str): The service's artist id, as returned by search_artist.
+
+        Yields:
+            [Track]: One release's tracks.
+        """
+        yield self.get_artist_all_tracks(artist_id)
+
     @abstractmethod
     def empty_playlist(self, playlist_id):
         """Removes every track from the given playlist.
@@ -126,3 +374,64 @@ class MusicService(ABC):
             track_ids ([str]): Track ids as returned on Track.id.
             playlist_id (str): The service's id for the playlist to add to.
         """
+
+    def sync_playlist(self, track_ids, playlist_id):
+        """Makes the given playlist hold exactly track_ids, in order.
+
+        This default just empties the playlist and refills it. Services that can read a
+        playlist's current contents should override it to write only the difference -
+        from one run to the next most of a playlist is usually unchanged.
+
+        Args:
+            track_ids ([str]): Track ids as returned on Track.id.
+            playlist_id (str): The service's id for the playlist to sync.
+        """
+        self.empty_playlist(playlist_id)
+        self.add_to_playlist(track_ids, playlist_id)
+        return True
+
+    @staticmethod
+    def _playlist_edits(current, wanted):
+        """The fewest removals and insertions that turn the playlist `current` into `wanted`.
+        The tracks both share in the same order - a longest common subsequence, found by the
+        Hunt-Szymanski method in O((n + r) log n) for r matching pairs - stay where they are,
+        and everything else is removed or inserted around them. A reorder or an early
+        removal so only touches the tracks that actually moved.
+
+        Returns:
+            ([int], [(int, [str])]): The positions in current to remove, ascending, and the
+                runs of wanted to insert as (position, ids), ascending. Applied after the
+                removals and in that order, each run's position is its position in wanted.
+        """
+        positions = {}
+        for position, track_id in enumerate(current):
+            positions.setdefault(track_id, []).append(position)
+        # tails[k] is the smallest position in current that ends a common subsequence of
+        # length k + 1, and links[k] that subsequence as (wanted index, position, previous link).
+        tails, links = [], []
+        for index, track_id in enumerate(wanted):
+            for position in reversed(positions.get(track_id, ())):
+                k = bisect.bisect_left(tails, position)
+                link = (index, position, links[k - 1] if k else None)
+                if k == len(tails):
+                    tails.append(position)
+                    links.append(link)
+                else:
+                    tails[k] = position
+                    links[k] = link
+        kept_wanted, kept_current = set(), set()
+        link = links[-1] if links else None
+        while link is not None:
+            index, position, link = link
+            kept_wanted.add(index)
+            kept_current.add(position)
+        removals = [position for position in range(len(current)) if position not in kept_current]
+        inserts = []
+        for index, track_id in enumerate(wanted):
+            if index in kept_wanted:
+                continue
+            if inserts and inserts[-1][0] + len(inserts[-1][1]) == index:
+                inserts[-1][1].append(track_id)
+            else:
+                inserts.append((index, [track_id]))
+        return removals, inserts
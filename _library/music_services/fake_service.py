@@ -0,0 +1,133 @@
+from _library.errors import SearchError
+from .base import MusicService, ArtistResult, Track
+
+
+def _artists_to_json(artists):
+    return [[artist.id, artist.name, list(artist.genres)] for artist in artists]
+
+
+def _tracks_to_json(tracks):
+    return [[track.id, track.name, track.artist_name, track.duration_ms] for track in tracks]
+
+
+class RecordingMusicService:
+    """Wraps a live MusicService and records every catalog answer it gives (artist
+    searches, top tracks, discographies) to a Cassette, for FakeMusicService to
+    replay later. Everything else is passed straight through.
+
+    Recorded at the MusicService level rather than as raw HTTP: replaying spotipy's
+    or tidalapi's own traffic would also mean replaying their OAuth logins, which
+    offline runs have no use for. Artist resolutions are cached above this layer
+    (see Playlist_Generator.resolve_artist), so every search that's made gets recorded.
+    """
+
+    def __init__(self, service, cassette, namespace):
+        self.service = service
+        self.cassette = cassette
+        self.namespace = namespace
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def search_artist(self, artist_name):
+        results = self.service.search_artist(artist_name)
+        self.cassette.save(self.namespace, ['search_artist', artist_name], _artists_to_json(results))
+        return results
+
+    def get_artist_top_tracks(self, artist_id):
+        tracks = self.service.get_artist_top_tracks(artist_id)
+        self.cassette.save(self.namespace, ['get_artist_top_tracks', artist_id], _tracks_to_json(tracks))
+        return tracks
+
+    def get_artist_all_tracks(self, artist_id):
+        tracks = self.service.get_artist_all_tracks(artist_id)
+        self.cassette.save(self.namespace, ['get_artist_all_tracks', artist_id], _tracks_to_json(tracks))
+        return tracks
+
+    def iter_artist_discography(self, artist_id):
+        # Saved again after every release, so however far the caller reads is what gets replayed.
+        releases = []
+        for release in self.service.iter_artist_discography(artist_id):
+            releases.append(_tracks_to_json(release))
+            self.cassette.save(self.namespace, ['iter_artist_discography', artist_id], releases)
+            yield release
+
+
+class SimulatedServiceError(Exception):
+    """What FakeMusicService raises for a simulated failure - an HTTP 503, so
+    MusicService._call retries it like a real one.
+    """
+
+    def __init__(self):
+        self.http_status = 503
+        super().__init__("Simulated HTTP 503 from FakeMusicService.")
+
+
+class FakeMusicService(MusicService):
+    """A MusicService with no network behind it: catalog calls are answered from what
+    a RecordingMusicService saved to the cassette (anything never recorded behaves
+    like an unknown artist), with the cassette's simulated latency and error rate.
+
+    Playlist writes only change self.playlists, and each one is appended to
+    self.playlist_writes (also kept in the cassette, under ['playlist_writes']), so a
+    replayed run's output can be inspected and compared.
+    """
+
+    def __init__(self, credentials, cassette, namespace, api_host=None, rate_limiter=None, verbose=False,
+                 error_logger=None, album_cache=None):
+        """
+        Args:
+            cassette (Cassette): Where the answers are replayed from.
+            namespace (str): The cassette namespace they were recorded under, the service's name.
+            api_host (str, optional): The API_HOST of the service being replayed, so calls are
+                held to the same request budget as the real thing. Defaults to no budget at all.
+            Everything else: see MusicService.
+        """
+        super().__init__(credentials, rate_limiter=rate_limiter, verbose=verbose, error_logger=error_logger,
+                         album_cache=album_cache)
+        self.API_HOST = api_host
+        self.cassette = cassette
+        self.namespace = namespace
+        self.playlists = {}  # playlist_id -> [track id]
+        self.playlist_writes = []  # {'operation': str, 'playlist_id': str, 'track_ids': [str]}
+
+    def _replay(self, *request):
+        if self.cassette.simulate_call():
+            raise SimulatedServiceError()
+        return self.cassette.load(self.namespace, list(request)) or []
+
+    def search_artist(self, artist_name):
+        try:
+            results = self._call(self._replay, 'search_artist', artist_name)
+        except SimulatedServiceError as e:
+            self.error_logger(e, True)
+            raise SearchError(artist_name)
+        return [ArtistResult(id=artist_id, name=name, genres=genres) for artist_id, name, genres in results]
+
+    def get_artist_top_tracks(self, artist_id):
+        return [Track(*track) for track in self._call(self._replay, 'get_artist_top_tracks', artist_id)]
+
+    def get_artist_all_tracks(self, artist_id):
+        return [Track(*track) for track in self._call(self._replay, 'get_artist_all_tracks', artist_id)]
+
+    def iter_artist_discography(self, artist_id):
+        for release in self._call(self._replay, 'iter_artist_discography', artist_id):
+            yield [Track(*track) for track in release]
+
+    def _record_write(self, operation, playlist_id, track_ids):
+        self.playlist_writes.append({'operation': operation, 'playlist_id': playlist_id, 'track_ids': list(track_ids)})
+        self.cassette.save(self.namespace, ['playlist_writes'], self.playlist_writes)
+
+    def empty_playlist(self, playlist_id):
+        removed = self.playlists.pop(playlist_id, [])
+        self._record_write('empty', playlist_id, removed)
+        if self.verbose:
+            print(f"Removed {len(removed)} tracks from playlist")
+        return True
+
+    def add_to_playlist(self, track_ids, playlist_id):
+        self.playlists.setdefault(playlist_id, []).extend(track_ids)
+        self._record_write('add', playlist_id, track_ids)
+        if self.verbose:
+            print(f"Added {len(track_ids)} tracks to playlist")
+        return True
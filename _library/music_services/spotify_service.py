@@ -1,12 +1,15 @@
-import time
+import math
 
 import requests
 import urllib3
 import spotipy as sp
 
-from _library.errors import SearchError
+from _library.errors import SearchError, OutOfTimeError
 from .base import MusicService, ArtistResult, Track
 
+# The order iter_artist_discography yields an artist's releases in, by album_group.
+RELEASE_GROUP_ORDER = {'single': 0, 'album': 1, 'compilation': 2, 'appears_on': 3}
+
 
 class SpotifyService(MusicService):
     """Wraps the Spotify Web API (via spotipy) behind the common MusicService interface.
@@ -17,23 +20,30 @@ class SpotifyService(MusicService):
     """
 
     EXTRA_CREDENTIAL_KEYS = ['CLIENT_ID', 'CLIENT_SECRET']
+    API_HOST = 'api.spotify.com'
+    ALBUMS_PER_REQUEST = 20  # The most the several-albums endpoint accepts at once.
+    PLAYLIST_ITEMS_PER_REQUEST = 100  # The most any playlist write accepts at once.
 
-    def __init__(self, credentials, sleep_time=0, verbose=False, error_logger=None):
-        super().__init__(credentials, sleep_time=sleep_time, verbose=verbose, error_logger=error_logger)
+    def __init__(self, credentials, rate_limiter=None, verbose=False, error_logger=None, album_cache=None):
+        super().__init__(credentials, rate_limiter=rate_limiter, verbose=verbose, error_logger=error_logger,
+                         album_cache=album_cache)
         session = requests.Session()
+        # No status-based retries at the urllib3 level: 429s and 5xxs have to reach
+        # _observe_response (with their Retry-After) so the shared adaptive budget can
+        # react, and MusicService._call retries them from there.
         retry = urllib3.Retry(
             total=0,
             connect=None,
             read=0,
             allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
             status=0,
-            backoff_factor=0.3,
-            status_forcelist=(429, 500, 502, 503, 504),
-            respect_retry_after_header=False  # <---
+            status_forcelist=(),
+            respect_retry_after_header=False
         )
         adapter = requests.adapters.HTTPAdapter(max_retries=retry)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
+        session.hooks['response'].append(self._observe_response)
         self.spot = sp.Spotify(auth_manager=sp.oauth2.SpotifyOAuth(
             client_id=credentials['CLIENT_ID'],
             client_secret=credentials['CLIENT_SECRET'],
@@ -49,49 +59,90 @@ class SpotifyService(MusicService):
                     artist_name=track['artists'][0]['name'],
                     duration_ms=track['duration_ms'])
 
-    def search_artist(self, artist_name, max_retries=3):
-        for attempt in range(max_retries):
-            try:
-                search_results = self.spot.search(q=artist_name, limit=50, type='artist')
-                time.sleep(self.sleep_time)
-                return [ArtistResult(id=item['uri'], name=item['name'], genres=item['genres'])
-                       for item in search_results["artists"]["items"]]
-            except KeyboardInterrupt:
-                raise
-            except Exception as e:
-                self.error_logger("Spotify artist search error I want to be able to handle:", True)
-                self.error_logger(e, True)
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # exponential backoff before retrying: 1s, 2s, 4s, ...
-        raise SearchError(artist_name)
+    def search_artist(self, artist_name):
+        try:
+            search_results = self._call(self.spot.search, q=artist_name, limit=50, type='artist')
+        except OutOfTimeError:
+            raise
+        except Exception as e:
+            self.error_logger("Spotify artist search error I want to be able to handle:", True)
+            self.error_logger(e, True)
+            raise SearchError(artist_name)
+        return [ArtistResult(id=item['uri'], name=item['name'], genres=item['genres'])
+                for item in search_results["artists"]["items"]]
 
     def get_artist_top_tracks(self, artist_id):
-        tracks = self.spot.artist_top_tracks(artist_id)["tracks"]
-        time.sleep(self.sleep_time)
+        tracks = self._call(self.spot.artist_top_tracks, artist_id)["tracks"]
         return [self._to_track(track) for track in tracks]
 
+    def _next_page(self, page):
+        """Follows a paging object's 'next' link, or returns None on the last page."""
+        if not page['next']:
+            return None
+        return self._call(self.spot.next, page)
+
+    def _get_artist_releases(self, artist_id):
+        """Every page of artist_albums, ordered by RELEASE_GROUP_ORDER and then by
+        track count, so singles and EPs (which Spotify groups as singles) come first.
+        """
+        page = self._call(self.spot.artist_albums, artist_id, limit=50)
+        releases = []
+        while page is not None:
+            releases.extend(page['items'])
+            page = self._next_page(page)
+        last = len(RELEASE_GROUP_ORDER)
+        releases.sort(key=lambda release: (RELEASE_GROUP_ORDER.get(release.get('album_group'), last),
+                                           release.get('total_tracks', 0)))
+        return releases
+
+    def _fetch_albums(self, album_ids):
+        """Fetches the albums' track lists into self.album_cache, ALBUMS_PER_REQUEST at a
+        time through the several-albums endpoint instead of one album_tracks call per
+        album. Only albums longer than the first page of tracks they come with need any
+        further requests.
+        """
+        for i in range(0, len(album_ids), self.ALBUMS_PER_REQUEST):
+            albums = self._call(self.spot.albums, album_ids[i:i + self.ALBUMS_PER_REQUEST])['albums']
+            for album in albums:
+                if album is None:  # Ids Spotify no longer knows come back as null entries.
+                    continue
+                tracks = []
+                page = album['tracks']
+                while page is not None:
+                    tracks.extend(page['items'])
+                    page = self._next_page(page)
+                self.album_cache.put(album['uri'], [self._to_track(track) for track in tracks])
+
+    def iter_artist_discography(self, artist_id):
+        """Yields the artist's releases in _get_artist_releases order, answering from
+        self.album_cache where it can. The rest are fetched only as the caller gets to
+        them, a full batch of the next uncached ones per request.
+        """
+        album_ids = [release['uri'] for release in self._get_artist_releases(artist_id)]
+        requested = set()
+        for position, album_id in enumerate(album_ids):
+            if album_id not in requested and album_id not in self.album_cache:
+                uncached = [i for i in album_ids[position:] if i not in requested and i not in self.album_cache]
+                requested.update(uncached[:self.ALBUMS_PER_REQUEST])
+                self._fetch_albums(uncached[:self.ALBUMS_PER_REQUEST])
+            tracks = self.album_cache.get(album_id)
+            if tracks is not None:  # None if Spotify no longer knows the album.
+                yield tracks
+
     def get_artist_all_tracks(self, artist_id):
-        album_ids = [a['uri'] for a in self.spot.artist_albums(artist_id)['items']]
-        time.sleep(self.sleep_time)
-        tracks = []
-        for album_id in album_ids:
-            tracks.extend(self.spot.album_tracks(album_id)['items'])
-            time.sleep(self.sleep_time)
-        return [self._to_track(track) for track in tracks]
+        """Fetches an artist's whole discography, see iter_artist_discography."""
+        return [track for release in self.iter_artist_discography(artist_id) for track in release]
 
     def empty_playlist(self, playlist_id):
         """Empties a Spotify playlist of its entries.
         Because of limitations, only a hundred tracks are removed at a time.
         """
-        tracks = self.spot.playlist_items(playlist_id)["items"]
-        time.sleep(self.sleep_time)
+        tracks = self._call(self.spot.playlist_items, playlist_id)["items"]
         counter = len(tracks)
         while len(tracks):
-            self.spot.playlist_remove_all_occurrences_of_items(
-                playlist_id, [track["track"]["uri"] for track in tracks])
-            time.sleep(self.sleep_time)
-            tracks = self.spot.playlist_items(playlist_id)["items"]
-            time.sleep(self.sleep_time)
+            self._call(self.spot.playlist_remove_all_occurrences_of_items,
+                       playlist_id, [track["track"]["uri"] for track in tracks])
+            tracks = self._call(self.spot.playlist_items, playlist_id)["items"]
             counter += len(tracks)
         if self.verbose:
             print(f"Removed {counter} tracks from playlist")
@@ -99,7 +150,7 @@ class SpotifyService(MusicService):
 
     def _get_user_id(self):
         if self._user_id is None:
-            self._user_id = self.spot.me()['id']
+            self._user_id = self._call(self.spot.me)['id']
         return self._user_id
 
     def add_to_playlist(self, track_ids, playlist_id):
@@ -110,11 +161,80 @@ class SpotifyService(MusicService):
         tracks_added = 0
         user_id = self._get_user_id()
         while tracks_added < number_of_tracks:
-            self.spot.user_playlist_add_tracks(user=user_id,
-                                               playlist_id=playlist_id,
-                                               tracks=track_ids[tracks_added:tracks_added + 100])
-            time.sleep(self.sleep_time)
+            self._call(self.spot.user_playlist_add_tracks,
+                       user=user_id,
+                       playlist_id=playlist_id,
+                       tracks=track_ids[tracks_added:tracks_added + 100])
             tracks_added += 100
         if self.verbose:
             print(f"Added {number_of_tracks} tracks to playlist")
         return True
+
+    def _get_playlist_track_ids(self, playlist_id):
+        """The playlist's current track uris, in order. Entries without a usable uri
+        (e.g. local files) come back as None, so positions stay correct.
+        """
+        page = self._call(self.spot.playlist_items, playlist_id,
+                          fields='items(track(uri)),next', additional_types=('track',))
+        track_ids = []
+        while page is not None:
+            track_ids.extend(item['track']['uri'] if item['track'] else None for item in page['items'])
+            page = self._next_page(page)
+        return track_ids
+
+    def _remove_playlist_positions(self, playlist_id, current, removals):
+        """Removes the tracks at the given (ascending) positions of current from the
+        playlist, last batch first so the positions of the batches still to go don't shift.
+        """
+        batch_size = self.PLAYLIST_ITEMS_PER_REQUEST
+        for start in reversed(range(0, len(removals), batch_size)):
+            positions = {}
+            for position in removals[start:start + batch_size]:
+                positions.setdefault(current[position], []).append(position)
+            self._call(self.spot.playlist_remove_specific_occurrences_of_items, playlist_id,
+                       [{'uri': uri, 'positions': uri_positions} for uri, uri_positions in positions.items()])
+
+    def _insert_into_playlist(self, track_ids, playlist_id, position):
+        """Inserts tracks into a Spotify playlist at the given position, a hundred at a time."""
+        user_id = self._get_user_id()
+        batch_size = self.PLAYLIST_ITEMS_PER_REQUEST
+        for start in range(0, len(track_ids), batch_size):
+            self._call(self.spot.user_playlist_add_tracks,
+                       user=user_id,
+                       playlist_id=playlist_id,
+                       tracks=track_ids[start:start + batch_size],
+                       position=position + start)
+
+    def sync_playlist(self, track_ids, playlist_id):
+        """Makes a Spotify playlist hold exactly track_ids, reading its contents once and
+        writing only what changed, whichever of two plans takes fewer write calls:
+            - keep the tracks the playlist already has in the right order (see
+              MusicService._playlist_edits), remove the others by position and insert
+              the missing ones where they belong, or
+            - overwrite the first 100 tracks with one replace-items call and append the rest.
+        An unchanged playlist costs no writes at all. A playlist holding entries without a
+        uri (e.g. local files) is always overwritten, as those can't be removed by position.
+        """
+        current = self._get_playlist_track_ids(playlist_id)
+        if current == track_ids:
+            if self.verbose:
+                print("Playlist already up to date")
+            return True
+        batch_size = self.PLAYLIST_ITEMS_PER_REQUEST
+        removals, inserts = self._playlist_edits(current, track_ids)
+        edit_writes = (math.ceil(len(removals) / batch_size)
+                       + sum(math.ceil(len(run) / batch_size) for _, run in inserts))
+        replace_writes = max(1, math.ceil(len(track_ids) / batch_size))
+        if edit_writes <= replace_writes and None not in current:
+            self._remove_playlist_positions(playlist_id, current, removals)
+            for position, run in inserts:
+                self._insert_into_playlist(run, playlist_id, position)
+            if self.verbose:
+                print(f"Kept {len(current) - len(removals)} tracks, removed {len(removals)} "
+                      f"and added {len(track_ids) - len(current) + len(removals)} in playlist")
+        else:
+            self._call(self.spot.playlist_replace_items, playlist_id, track_ids[:batch_size])
+            if self.verbose:
+                print(f"Replaced {len(current)} tracks in playlist with {min(len(track_ids), batch_size)}")
+            self.add_to_playlist(track_ids[batch_size:], playlist_id)
+        return True
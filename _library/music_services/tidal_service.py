@@ -1,9 +1,8 @@
-import time
 from pathlib import Path
 
 import tidalapi as td
 
-from _library.errors import SearchError
+from _library.errors import SearchError, OutOfTimeError
 from .base import MusicService, ArtistResult, Track
 
 
@@ -26,14 +25,19 @@ class TidalService(MusicService):
     """
 
     SESSION_FILE = 'tidal_session.json'
+    API_HOST = 'api.tidal.com'
+    PLAYLIST_PAGE_SIZE = 100
 
-    def __init__(self, credentials, sleep_time=0, verbose=False, error_logger=None):
-        super().__init__(credentials, sleep_time=sleep_time, verbose=verbose, error_logger=error_logger)
+    def __init__(self, credentials, rate_limiter=None, verbose=False, error_logger=None, album_cache=None):
+        super().__init__(credentials, rate_limiter=rate_limiter, verbose=verbose, error_logger=error_logger,
+                         album_cache=album_cache)
         self.session = td.Session()
         # Loads a previously saved session from SESSION_FILE if there is one and it's
         # still valid; otherwise walks through the interactive OAuth login and saves
         # the result to SESSION_FILE for next time.
         self.session.login_session_file(Path(self.SESSION_FILE))
+        # tidalapi makes every request through this requests.Session - see MusicService._observe_response.
+        self.session.request_session.hooks['response'].append(self._observe_response)
         self._playlist_cache = {}  # playlist_id -> tidalapi Playlist, populated by _get_playlist
 
     @staticmethod
@@ -49,35 +53,40 @@ class TidalService(MusicService):
                     artist_name=artist_name,
                     duration_ms=(track.duration or 0) * 1000)  # TIDAL reports duration in seconds
 
-    def search_artist(self, artist_name, max_retries=3):
-        for attempt in range(max_retries):
-            try:
-                search_results = self.session.search(artist_name, models=[td.Artist], limit=50)
-                time.sleep(self.sleep_time)
-                return [ArtistResult(id=str(artist.id), name=artist.name, genres=[])
-                       for artist in search_results['artists']]
-            except KeyboardInterrupt:
-                raise
-            except Exception as e:
-                self.error_logger("Tidal artist search error I want to be able to handle:", True)
-                self.error_logger(e, True)
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # exponential backoff before retrying: 1s, 2s, 4s, ...
-        raise SearchError(artist_name)
+    def search_artist(self, artist_name):
+        try:
+            search_results = self._call(self.session.search, artist_name, models=[td.Artist], limit=50)
+        except OutOfTimeError:
+            raise
+        except Exception as e:
+            self.error_logger("Tidal artist search error I want to be able to handle:", True)
+            self.error_logger(e, True)
+            raise SearchError(artist_name)
+        return [ArtistResult(id=str(artist.id), name=artist.name, genres=[])
+                for artist in search_results['artists']]
 
     def get_artist_top_tracks(self, artist_id):
-        tracks = self.session.artist(artist_id).get_top_tracks(limit=50)
-        time.sleep(self.sleep_time)
+        tracks = self._call(lambda: self.session.artist(artist_id).get_top_tracks(limit=50))
         return [self._to_track(track) for track in tracks]
 
+    def iter_artist_discography(self, artist_id):
+        """Yields the artist's EPs and singles, then their albums, fewest tracks first within
+        each, answering from self.album_cache where it can and otherwise fetching each
+        release's tracks only as the caller gets to it.
+        """
+        artist = self._call(self.session.artist, artist_id)
+        for get_releases in (artist.get_ep_singles, artist.get_albums):
+            releases = self._call(get_releases, limit=50)
+            for album in sorted(releases, key=lambda release: release.num_tracks or 0):
+                tracks = self.album_cache.get(str(album.id))
+                if tracks is None:
+                    tracks = [self._to_track(track) for track in self._call(album.tracks)]
+                    self.album_cache.put(str(album.id), tracks)
+                yield tracks
+
     def get_artist_all_tracks(self, artist_id):
-        albums = self.session.artist(artist_id).get_albums(limit=50)
-        time.sleep(self.sleep_time)
-        tracks = []
-        for album in albums:
-            tracks.extend(album.tracks())
-            time.sleep(self.sleep_time)
-        return [self._to_track(track) for track in tracks]
+        """Fetches an artist's whole discography, see iter_artist_discography."""
+        return [track for release in self.iter_artist_discography(artist_id) for track in release]
 
     def _get_playlist(self, playlist_id):
         """Returns the tidalapi Playlist for playlist_id, fetching it once and reusing
@@ -86,15 +95,14 @@ class TidalService(MusicService):
         playlist-fetch calls for a farm_crowns/steal_crowns run.
         """
         if playlist_id not in self._playlist_cache:
-            self._playlist_cache[playlist_id] = self.session.playlist(playlist_id)
+            self._playlist_cache[playlist_id] = self._call(self.session.playlist, playlist_id)
         return self._playlist_cache[playlist_id]
 
     def empty_playlist(self, playlist_id):
         """Empties a TIDAL playlist of its entries."""
         playlist = self._get_playlist(playlist_id)
         counter = playlist.num_tracks
-        playlist.clear()
-        time.sleep(self.sleep_time)
+        self._call(playlist.clear)
         if self.verbose:
             print(f"Removed {counter} tracks from playlist")
         return True
@@ -108,9 +116,54 @@ class TidalService(MusicService):
         number_of_tracks = len(track_ids)
         tracks_added = 0
         while tracks_added < number_of_tracks:
-            playlist.add(track_ids[tracks_added:tracks_added + 100])
-            time.sleep(self.sleep_time)
+            self._call(playlist.add, track_ids[tracks_added:tracks_added + 100])
             tracks_added += 100
         if self.verbose:
             print(f"Added {number_of_tracks} tracks to playlist")
         return True
+
+    def _get_playlist_item_ids(self, playlist):
+        """The ids of everything in the playlist, tracks and videos alike, in order, read
+        PLAYLIST_PAGE_SIZE at a time - the indices remove_by_indices takes count both.
+        None if that doesn't come to as many items as TIDAL says the playlist holds.
+        """
+        expected = (playlist.num_tracks or 0) + (playlist.num_videos or 0)
+        item_ids = []
+        while len(item_ids) < expected:
+            page = self._call(playlist.items, limit=self.PLAYLIST_PAGE_SIZE, offset=len(item_ids))
+            if not page:
+                break
+            item_ids.extend(str(item.id) for item in page)
+        return item_ids if len(item_ids) == expected else None
+
+    def sync_playlist(self, track_ids, playlist_id):
+        """Makes a TIDAL playlist hold exactly track_ids, reading its contents once and
+        writing only what changed: the tracks it already has in the right order are kept
+        (see MusicService._playlist_edits), the others are removed in a single
+        remove-by-indices call and the missing ones are inserted where they belong. An
+        unchanged playlist costs no writes at all.
+
+        If the playlist's items can't all be read, positions can't be trusted, so it's
+        emptied and refilled instead.
+        """
+        playlist = self._get_playlist(playlist_id)
+        current = self._get_playlist_item_ids(playlist)
+        if current == track_ids:
+            if self.verbose:
+                print("Playlist already up to date")
+            return True
+        if current is None:
+            return super().sync_playlist(track_ids, playlist_id)
+        removals, inserts = self._playlist_edits(current, track_ids)
+        if len(removals) == len(current):
+            if current:
+                self._call(playlist.clear)
+        elif removals:
+            self._call(playlist.remove_by_indices, removals)
+        for position, run in inserts:
+            for start in range(0, len(run), 100):
+                self._call(playlist.add, run[start:start + 100], position=position + start)
+        if self.verbose:
+            print(f"Kept {len(current) - len(removals)} tracks, removed {len(removals)} "
+                  f"and added {len(track_ids) - len(current) + len(removals)} in playlist")
+        return True
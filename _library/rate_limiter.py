@@ -0,0 +1,148 @@
+import threading
+import time
+
+from _library.errors import OutOfTimeError
+
+
+class TokenBucket:
+    """A thread-safe token bucket: refills at `rate` tokens per second, holding at
+    most `burst` of them, and every request spends one.
+
+    acquire() reserves its token under the lock and then sleeps outside it, so
+    concurrent callers queue up in arrival order without holding each other up
+    while they wait. The token count may go negative - that's the debt already
+    reserved by callers currently sleeping.
+
+    The rate adapts to how the API responds (additive increase, multiplicative
+    decrease): every success nudges it up by `increase`, never past max_rate, and
+    every throttled or failed call halves it, never below min_rate. A Retry-After
+    from the server blocks every caller until it has passed, exactly.
+    """
+
+    def __init__(self, rate, burst=1, max_rate=None, min_rate=0.1, increase=0.1):
+        """
+        Args:
+            rate (float): Starting requests per second.
+            burst (int, optional): How many requests may go out back-to-back after
+                an idle spell. Defaults to 1 (no bursting).
+            max_rate (float, optional): The most successes may raise the rate to.
+                Defaults to `rate`, i.e. the rate only ever drops below its start.
+            min_rate (float, optional): The least throttling may lower it to. Defaults to 0.1.
+            increase (float, optional): Requests per second added per success. Defaults to 0.1.
+        """
+        self.rate = rate
+        self.max_rate = max(rate, max_rate or rate)
+        self.min_rate = min(rate, min_rate)
+        self.increase = increase
+        self.capacity = max(1, burst)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + max(0, now - self._last_refill) * self.rate)
+        self._last_refill = max(now, self._last_refill)
+
+    def acquire(self, deadline=None):
+        """Blocks until a request may go out under this bucket's budget.
+
+        Args:
+            deadline (float, optional): The time.monotonic() time the request has to go out by.
+
+        Raises:
+            OutOfTimeError: If it can't, instead of waiting. The request doesn't spend a
+                token then.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+            if deadline is not None and max(now + wait, self._blocked_until) > deadline:
+                raise OutOfTimeError()
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        # A Retry-After may have arrived while this caller was waiting its turn.
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                blocked = self._blocked_until - now
+            if blocked <= 0:
+                return
+            if deadline is not None and now + blocked > deadline:
+                raise OutOfTimeError()
+            time.sleep(blocked)
+
+    def report_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def report_throttled(self, retry_after=None):
+        """Halves the rate. With `retry_after` (seconds), also holds every caller back
+        until it has passed, and starts the bucket empty again afterwards so the
+        queued-up callers don't all burst out at once.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                self._tokens = min(self._tokens, 0)
+                self._last_refill = self._blocked_until
+
+
+class RateLimiter:
+    """One TokenBucket per API host, shared by everything that talks to that host -
+    Playlist_Generator's last.fm calls and the active MusicService alike - so
+    parallel code spends a single budget instead of each thread pacing itself.
+
+    Hosts that were never configured are not limited at all.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._deadlines = {}
+
+    def configure(self, host, rate, burst=1, max_rate=None):
+        """Sets (or replaces) the budget for `host`. See TokenBucket for the arguments."""
+        self._buckets[host] = TokenBucket(rate, burst, max_rate=max_rate)
+
+    def set_deadline(self, host, deadline):
+        """From now on, requests to `host` that would have to wait past `deadline` (a
+        time.monotonic() time) raise OutOfTimeError instead - see TokenBucket.acquire.
+        None lifts the deadline.
+        """
+        if deadline is None:
+            self._deadlines.pop(host, None)
+        else:
+            self._deadlines[host] = deadline
+
+    def acquire(self, host):
+        """Blocks until a request to `host` fits within its budget."""
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            bucket.acquire(self._deadlines.get(host))
+
+    def report_success(self, host):
+        """Tells `host`'s budget a request went through fine, see TokenBucket.report_success."""
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            bucket.report_success()
+
+    def report_throttled(self, host, retry_after=None):
+        """Tells `host`'s budget a request was throttled or failed server-side, see
+        TokenBucket.report_throttled.
+        """
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            bucket.report_throttled(retry_after)
+
+    def rate(self, host):
+        """`host`'s current requests per second, or None if it isn't limited."""
+        bucket = self._buckets.get(host)
+        return bucket.rate if bucket is not None else None
+
+    def rates(self):
+        """{host: current requests per second} for every limited host."""
+        return {host: round(bucket.rate, 2) for host, bucket in self._buckets.items()}
@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+
+
+class RetryPolicy:
+    """How often, and how patiently, to retry a failing request: exponential backoff
+    with full jitter (a random wait between 0 and the current backoff, so parallel
+    workers that failed together don't all retry in lockstep), capped per request.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1, max_delay=60):
+        """
+        Args:
+            max_attempts (int, optional): Attempts per request, the first one included. Defaults to 5.
+            base_delay (float, optional): Backoff ceiling in seconds after the first failure,
+                doubled after every further one. Defaults to 1.
+            max_delay (float, optional): The backoff ceiling never grows past this. Defaults to 60.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, failures):
+        """Seconds to wait before the next attempt, after `failures` failed ones."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (failures - 1)))
+
+
+class CircuitBreaker:
+    """Stops calls to a service after sustained failure, instead of every caller
+    spending its whole retry budget against an API that's down.
+
+    After `failure_threshold` failures in a row the breaker opens and allow()
+    returns False. Once `reset_seconds` have passed a single trial call is let
+    through: success closes the breaker again, failure re-opens it for another
+    `reset_seconds`. Thread-safe, so parallel workers can share one breaker.
+    """
+
+    def __init__(self, failure_threshold=10, reset_seconds=300):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """Whether a call may go out now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
@@ -0,0 +1 @@
+"""Benchmarks for the playlist pipeline on synthetic libraries, see __main__.py."""
@@ -0,0 +1,216 @@
+"""Times the hot paths of the playlist pipeline on synthetic data, without touching
+last.fm or a music service, and writes the results as JSON.
+
+    python -m benchmarks --sizes 1000 10000 100000 --opponents 10 --output bench.json
+
+Compare two result files stage by stage (same stage, artists and cached_artists) to
+catch regressions, or read one file across sizes to see how each stage scales.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+
+import playlist_generator
+from playlist_generator import Playlist_Generator, _TrackIdCollector, BIG_NUMBER
+from _library.artist_store import ArtistStore, SAVED_ARTISTS_DB
+from _library.cassette import Cassette, OFFLINE_REPLAY
+from _library.file_handler import (generate_settings, store_path,
+                                   save_lastfm_credentials, save_service_credentials,
+                                   get_failed_artists, save_failed_artists,
+                                   get_no_song_artists, save_no_song_artists)
+from _library.rate_limiter import RateLimiter
+from benchmarks import synthetic
+
+MUSIC_SERVICE = 'Spotify'
+CROWN_GOAL = 30
+WANTED_GENRES = ['+rock', 'metal', 'jazz', 'swedish']
+SEARCHED_ARTISTS = 500  # Looked up from scratch, see benchmark_size.
+SEARCH_LATENCY_MS = 2  # Simulated for every call the music service gets while they are.
+LOOKAHEAD = 4
+LASTFM_CREDENTIALS = {'LASTFM_API_KEY': 'benchmark', 'LASTFM_API_SECRET': 'benchmark',
+                      'LASTFM_USERNAME': 'me', 'LASTFM_PASSWORD': 'benchmark'}
+
+
+def make_generator(opponent_list, latency_ms=0):
+    """A Playlist_Generator built from a generated config.yaml in offline_mode 2 (replay),
+    with made-up credentials, so it runs the shipped code with no network and no music
+    service behind it. Its stores start out empty, in a scratch directory of their own.
+    Every replayed call takes latency_ms. Must run in the benchmark's working directory, see main.
+    """
+    settings = generate_settings()
+    settings['general_settings'].update({'verbose': 0,
+                                         'music_service': MUSIC_SERVICE,
+                                         'genre_source': None,
+                                         'popular': 1,
+                                         'offline_mode': OFFLINE_REPLAY,
+                                         'offline_latency_ms': latency_ms})
+    settings['stealing_settings'].update({'crown_goal': CROWN_GOAL, 'overtake': 0})
+    save_lastfm_credentials(LASTFM_CREDENTIALS)
+    save_service_credentials(MUSIC_SERVICE, {'FARMING_PLAYLIST_ID': 'farming', 'STEALING_PLAYLIST_ID': 'stealing',
+                                             'CLIENT_ID': 'benchmark', 'CLIENT_SECRET': 'benchmark'})
+    synthetic.record_lastfm_login(Cassette(), LASTFM_CREDENTIALS['LASTFM_USERNAME'],
+                                  LASTFM_CREDENTIALS['LASTFM_PASSWORD'])
+    with open('opponent_list.txt', 'w') as file:
+        file.writelines(f"{opponent}\n" for opponent in opponent_list)
+    # Nothing configured, so nothing is limited - the stages time the code, not the budget.
+    pg = Playlist_Generator(settings, rate_limiter=RateLimiter())
+    pg.max_songs_per_artist = BIG_NUMBER  # What farm_crowns sets for max_songs_per_artist: 0.
+    return pg
+
+
+def measure(function, repeat, setup=None):
+    """Seconds taken by each of `repeat` calls of function(), setup() running untimed before each."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark_size(size, opponents, cache_shares, repeat):
+    """Yields (stage, cached_artists, timings) for every stage at `size` artists."""
+    names = synthetic.artist_names(size)
+    own_counts = synthetic.playcounts(size)
+    synthetic.SyntheticLastfmUser.libraries['me'] = (names, own_counts)
+    own_scrobbles = dict(zip(names, own_counts))
+    snapshots = synthetic.opponent_snapshots(names, opponents, crown_goal=CROWN_GOAL)
+    pg = make_generator(list(snapshots))
+
+    real_user = playlist_generator.pl_User
+    playlist_generator.pl_User = synthetic.SyntheticLastfmUser
+    try:
+        yield 'get_user_scrobbles', None, measure(lambda: pg.get_user_scrobbles('me'), repeat)
+        yield 'get_user_scrobbles_cutoff', None, measure(
+            lambda: pg.get_user_scrobbles('me', min_scrobbles=CROWN_GOAL), repeat)
+    finally:
+        playlist_generator.pl_User = real_user
+
+    merged = pg.merge_opponent_snapshots(snapshots)
+    yield 'steal_crowns_merge', None, measure(lambda: pg.merge_opponent_snapshots(snapshots), repeat)
+    yield 'steal_crowns_diff', None, measure(lambda: pg.get_steal_targets(merged, own_scrobbles, CROWN_GOAL),
+                                             repeat, setup=pg.remove_list.clear)
+    pg.close()
+
+    for share in cache_shares:
+        cached_names = names[:max(1, int(size * share))]
+        saved = synthetic.saved_artists(cached_names)
+        pg = make_generator([])
+        pg.saved_artists.update(saved)
+        top_artists = [[name, 10] for name in cached_names]
+        outcomes = [saved[name]['popular'] for name in cached_names]
+
+        def bucket():
+            collector = _TrackIdCollector(pg, BIG_NUMBER)
+            for artist, outcome in zip(top_artists, outcomes):
+                collector.add(artist, outcome)
+            return collector.track_ids()
+
+        yield 'track_id_bucketing', len(saved), measure(bucket, repeat)
+        yield 'get_track_ids', len(saved), measure(lambda: pg.get_track_ids(top_artists, max_entries=BIG_NUMBER),
+                                                   repeat)
+
+        pg.genres = WANTED_GENRES
+        genre_lists = [artist['genres_spotify'] for artist in saved.values()]
+        yield 'check_genres', len(saved), measure(lambda: [pg.check_genres(genres) for genres in genre_lists],
+                                                  repeat)
+
+        # Every entry changed, as after a first run over a library this size.
+        yield 'saved_artists_save', len(saved), measure(pg.saved_artists.save, repeat,
+                                                        setup=lambda: pg.saved_artists.update(saved))
+
+        def load_saved_artists():
+            with ArtistStore(MUSIC_SERVICE, store_path(SAVED_ARTISTS_DB)) as store:
+                return [store[name] for name in cached_names]
+
+        yield 'saved_artists_load', len(saved), measure(load_saved_artists, repeat)
+        pg.close()
+
+    # Artists nobody has looked up yet, each searched for - one at a time, then with lookups
+    # running side by side, which mustn't change the playlist. The latency makes them overlap
+    # the way real requests do.
+    searched = [[name, 10] for name in names[:SEARCHED_ARTISTS]]
+    synthetic.record_service_catalog(Cassette(), MUSIC_SERVICE, [artist[0] for artist in searched])
+    generators, playlists = [], {}
+
+    def new_generator(lookahead):
+        pg = make_generator([], latency_ms=SEARCH_LATENCY_MS)
+        pg.track_id_lookahead = lookahead
+        generators.append(pg)
+
+    def get_searched_track_ids():
+        pg = generators.pop()
+        playlists[pg.track_id_lookahead] = pg.get_track_ids(searched, max_entries=BIG_NUMBER)
+        pg.close()
+
+    for lookahead in (0, LOOKAHEAD):
+        yield f'searching_lookahead_{lookahead}', 0, measure(
+            get_searched_track_ids, repeat, setup=lambda: new_generator(lookahead))
+    if playlists[0] != playlists[LOOKAHEAD]:
+        raise RuntimeError(f"track_id_lookahead {LOOKAHEAD} gave a different playlist than no lookahead "
+                           f"for {len(searched)} searched artists.")
+
+    failed = synthetic.bad_artists(names, seed=1)
+    no_songs = synthetic.bad_artists(names, seed=2)
+
+    def save_yaml_stores():
+        save_failed_artists(failed, MUSIC_SERVICE)
+        save_no_song_artists(no_songs, MUSIC_SERVICE)
+
+    def load_yaml_stores():
+        get_failed_artists(MUSIC_SERVICE)
+        get_no_song_artists(MUSIC_SERVICE)
+
+    yield 'yaml_stores_save', None, measure(save_yaml_stores, repeat)
+    yield 'yaml_stores_load', None, measure(load_yaml_stores, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Library sizes in artists, up to 1000000. Default: 1000 10000 100000.")
+    parser.add_argument('--opponents', type=int, default=10, help="Opponents per library. Default: 10.")
+    parser.add_argument('--cache-shares', type=float, nargs='+', default=[0.1, 1.0],
+                        help="saved_artists sizes to try, as shares of the library. Default: 0.1 1.0.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage. Default: 3.")
+    parser.add_argument('--output', default='bench_output.json', help="Default: bench_output.json.")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    report = {'timestamp': int(time.time()),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'opponents': args.opponents,
+              'repeat': args.repeat,
+              'results': []}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        # The config, credentials and cassette make_generator writes go to the working directory.
+        os.chdir(scratch)
+        try:
+            for size in args.sizes:
+                for stage, cached_artists, timings in benchmark_size(size, args.opponents, args.cache_shares,
+                                                                     args.repeat):
+                    report['results'].append({'stage': stage,
+                                              'artists': size,
+                                              'cached_artists': cached_artists,
+                                              'min_seconds': min(timings),
+                                              'median_seconds': statistics.median(timings),
+                                              'seconds': timings})
+                    print(f"{stage:>26} {size:>8} artists: {min(timings):.4f}s")
+        finally:
+            os.chdir(cwd)
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
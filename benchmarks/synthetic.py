@@ -0,0 +1,116 @@
+"""Synthetic data shaped like what Playlist_Generator gets from last.fm and keeps on disk.
+
+Everything is generated from a seeded random.Random, so a given size always produces
+the same data and timings stay comparable between runs.
+"""
+import hashlib
+import random
+import time
+
+from _library.cassette import _lastfm_request_key
+
+GENRES = ['rock', 'indie rock', 'pop', 'synthpop', 'jazz', 'free jazz', 'metal', 'black metal',
+          'folk', 'swedish folk', 'hip hop', 'techno', 'ambient', 'punk', 'soul', 'blues']
+
+PAGE_SIZE = 512  # Artists per getTopArtists page, as requested by get_user_scrobbles.
+
+
+def artist_names(count, seed=0):
+    """`count` distinct artist names."""
+    rng = random.Random(seed)
+    return [f"Artist {index} {rng.choice(GENRES).title()}" for index in range(count)]
+
+
+def playcounts(count, seed=0, top=20000):
+    """`count` playcounts sorted descending, falling off roughly like a real library:
+    a few artists with thousands of plays and a long tail of ones and twos.
+    """
+    rng = random.Random(seed)
+    counts = [max(1, int(top / (1 + index * rng.uniform(0.5, 1.5)) ** 0.9)) for index in range(count)]
+    counts.sort(reverse=True)
+    return counts
+
+
+class SyntheticLastfmUser:
+    """Stands in for advanced_pylast_User in get_user_scrobbles, serving one synthetic
+    library from memory in getTopArtists pages.
+    """
+
+    libraries = {}  # username -> (names, playcounts), filled in by the benchmarks
+
+    def __init__(self, username, network=None):
+        self.names, self.playcounts = self.libraries[username]
+
+    def get_top_artist_playcounts(self, period=None, limit=PAGE_SIZE, page=1):
+        start = (page - 1) * limit
+        total_pages = max(1, -(-len(self.names) // limit))
+        return self.names[start:start + limit], self.playcounts[start:start + limit], total_pages
+
+
+def opponent_snapshots(names, opponents, seed=0, crown_goal=30, coverage=0.3):
+    """Snapshots (see file_handler.get_opponent_snapshots) for `opponents` opponents, each
+    having at least crown_goal plays of a random `coverage` share of `names`.
+    """
+    rng = random.Random(seed)
+    per_opponent = max(1, int(len(names) * coverage))
+    return {f"opponent{index}": {'timestamp': 0,
+                                 'crown_goal': crown_goal,
+                                 'data': {name: rng.randint(crown_goal, 5000)
+                                          for name in rng.sample(names, per_opponent)}}
+            for index in range(opponents)}
+
+
+def saved_artists(names, seed=0, tracks_per_artist=10):
+    """A saved_artists cache (see file_handler.get_saved_artists) with an entry for every
+    name, popular and full track lists included.
+    """
+    rng = random.Random(seed)
+    saved = {}
+    for index, name in enumerate(names):
+        tracks = [f"track{index}x{track}" for track in range(rng.randint(1, tracks_per_artist))]
+        saved[name] = {'full': tracks,
+                       'popular': tracks[:10],
+                       'uri': f"artist{index}",
+                       'genres_spotify': rng.sample(GENRES, rng.randint(0, 3)),
+                       'genres_lastfm': [],
+                       'timestamp': int(time.time()) - rng.randint(0, 30 * 86400),
+                       'search_name': name}
+    return saved
+
+
+def bad_artists(names, seed=0, share=0.1):
+    """A failed_artists/no_song_artists store: {artist: plays} for a `share` of `names`."""
+    rng = random.Random(seed)
+    return {name: rng.randint(1, 100) for name in rng.sample(names, int(len(names) * share))}
+
+
+def record_lastfm_login(cassette, username, password):
+    """Records the auth.getMobileSession answer pylast's LastFMNetwork logs in with, so a
+    Playlist_Generator can be built in offline_mode 2 (replay) from made-up credentials.
+    """
+    password_hash = hashlib.md5(password.encode('UTF-8')).hexdigest()
+    params = {'username': username,
+              'authToken': hashlib.md5((username + password_hash).encode('UTF-8')).hexdigest(),
+              'method': 'auth.getMobileSession'}
+    response = ('<?xml version="1.0" encoding="utf-8"?>\n<lfm status="ok"><session>'
+                f'<name>{username}</name><key>synthetic</key><subscriber>0</subscriber></session></lfm>')
+    cassette.save('lastfm', _lastfm_request_key(params), response)
+
+
+def record_service_catalog(cassette, namespace, names, seed=0, namesakes=3, unknown_share=0.1):
+    """Records, for FakeMusicService to replay, an artist search and top tracks for every
+    name. Each search also brings up a few other artists from `names` under other ids, the
+    way a real search brings up similar names, so what one lookup adds to artist_index can
+    decide how a later one resolves. Searches for an `unknown_share` of the names find nothing.
+    """
+    rng = random.Random(seed)
+    for index, name in enumerate(names):
+        results = [] if rng.random() < unknown_share else [[f"artist{index}", name, []]]
+        for other in rng.sample(range(len(names)), min(namesakes, len(names))):
+            if other != index:
+                results.append([f"namesake{other}", names[other], []])
+        cassette.save(namespace, ['search_artist', name], results)
+        for artist_id in (f"artist{index}", f"namesake{index}"):
+            tracks = [[f"{artist_id}x{track}", f"Track {track}", name, rng.randint(60000, 600000)]
+                      for track in range(rng.randint(1, 10))]
+            cassette.save(namespace, ['get_artist_top_tracks', artist_id], tracks)
@@ -1,13 +1,23 @@
 import bisect
-import json
+import difflib
+import operator
 import pylast as pl
+import queue
+import tempfile
+import threading
 import time
 import yaml
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from _library.advanced_pylast import advanced_pylast_User as pl_User
 from _library.file_handler import (get_config, get_blacklist,
                                    get_opponent_list,
                                    get_saved_artists, save_artist_info,
+                                   get_artist_index, get_search_cache,
+                                   save_search_cache as save_search_cache_to_file,
+                                   get_album_cache, save_album_cache as save_album_cache_to_file,
+                                   save_artist_index as save_artist_index_to_file,
                                    get_failed_artists, get_no_song_artists,
                                    save_failed_artists as save_failed_artists_to_file,
                                    save_no_song_artists as save_no_song_artists_to_file,
@@ -15,9 +25,18 @@ from _library.file_handler import (get_config, get_blacklist,
                                    get_service_credentials, save_service_credentials,
                                    migrate_legacy_auth_json, write_yaml,
                                    append_string_to_txt,
-                                   get_own_scrobbles_cache, save_own_scrobbles_cache)
-from _library.music_services import get_music_service_class
-from _library.errors import GenreError, ArtistNotFoundError, NoSongsFoundError, SearchError
+                                   get_own_scrobbles_cache, save_own_scrobbles_cache,
+                                   get_opponent_snapshots, save_opponent_snapshots,
+                                   set_store_directory, store_path)
+from _library.music_services import (get_music_service_class, ArtistResult, SearchCache, AlbumCache,
+                                     FakeMusicService, RecordingMusicService)
+from _library.cassette import Cassette, install_pylast_cassette, OFFLINE_OFF, OFFLINE_RECORD, OFFLINE_REPLAY
+from _library.genre_matcher import GenreMatcher
+from _library.journal import RunJournal, journal_filename
+from _library.rate_limiter import RateLimiter
+from _library.retry_policy import RetryPolicy, CircuitBreaker
+from _library.errors import (PlayListError, GenreError, ArtistNotFoundError, NoSongsFoundError, SearchError,
+                             LastfmUnavailableError, OutOfTimeError)
 
 BIG_NUMBER = 1000000  # Maybe replace this with numpy.inf or something...
 
@@ -28,6 +47,34 @@ BIG_NUMBER = 1000000  # Maybe replace this with numpy.inf or something...
 # service itself is struggling and worth stopping early for.
 MAX_CONSECUTIVE_SEARCH_ERRORS = 3
 
+# How many genre configurations (see artist_matches_genres) a saved artist remembers
+# whether it matches - farming's and stealing's, and a couple of edits to either.
+GENRE_MATCH_MEMO_SIZE = 4
+
+# get_track_ids looks artists up in blocks of this many: what a block's searches add to
+# artist_index is only used from the next block on, so lookups running side by side
+# never see each other's results and the playlist doesn't depend on their timing.
+TRACK_ID_BLOCK_SIZE = 32
+
+# Alternative spellings tried, in order of preference, when looking an artist up on the
+# music service - see Playlist_Generator.resolve_artist.
+SEARCH_NAME_METHODS = [lambda x: x,
+                       lambda x: x.replace(' and ', ' & ').replace(' och ', ' & '),
+                       lambda x: x.lower(),
+                       lambda x: x.upper(),
+                       lambda x: ''.join(c for c in x if c.isalnum())]
+
+# The RateLimiter key every last.fm call is budgeted under - see _library/rate_limiter.py.
+LASTFM_HOST = 'ws.audioscrobbler.com'
+
+# last.fm error codes that mean "try again later" rather than "this request is wrong":
+# 8 operation failed, 11 service offline, 16 temporarily unavailable, 29 rate limit
+# exceeded - plus the HTTP 5xx codes pylast reports as a WSError status.
+_TRANSIENT_LASTFM_ERRORS = {'8', '11', '16', '29', '500', '502', '503', '504'}
+
+# How long the last.fm circuit breaker stays open before letting a trial request through.
+LASTFM_CIRCUIT_BREAKER_RESET_SECONDS = 300
+
 # Friendlier prompt text for credential keys asked for interactively. Keys not
 # listed here (e.g. a future service's own extra keys) just use the raw key name.
 _CREDENTIAL_PROMPT_HINTS = {
@@ -38,18 +85,203 @@ _CREDENTIAL_PROMPT_HINTS = {
 }
 
 
+class _TrackIdCollector:
+    """Collects get_artist_track_ids outcomes, fed in priority order, into the playlist
+    get_track_ids returns: artists bucketed by how many tracks they contribute (fewest
+    first), stopping once max_entries is reached or the search API looks unhealthy.
+
+    Kept apart from get_track_ids' loop, so the decisions only depend on the order
+    outcomes are fed in, never on how or when they were fetched.
+    """
+
+    def __init__(self, generator, max_entries, tracks_added=0):
+        self.generator = generator
+        self.max_entries = max_entries
+        self.tracks_added = tracks_added
+        self.bucketed_track_ids = [[], [], [], [], [], [], [], [], [], []]
+        self.long_track_ids = []
+        self.consecutive_search_errors = 0
+
+    def add(self, artist, outcome):
+        """Handles one artist's outcome: its track ids, or the PlayListError looking them up raised.
+
+        Returns:
+            bool: True once no further artists should be added.
+        """
+        pg = self.generator
+        pg.checkpoint_if_due()
+        try:
+            if isinstance(outcome, PlayListError):
+                raise outcome
+            temp_tracks = outcome
+            if temp_tracks is None:
+                print("### I am here ###")
+                raise ArtistNotFoundError(artist)
+            elif len(temp_tracks):
+                self.consecutive_search_errors = 0
+                if pg.verbose:
+                    art_print_string = artist[0] + ":"
+                    if len(artist[0]) < 32:
+                        art_print_string = " " * (8 - (len(artist[0]) + 1) % 8) + art_print_string
+                    while len(art_print_string) < 32:
+                        art_print_string = " " * 8 + art_print_string
+                    art_print_string += f" {len(temp_tracks)} of {artist[1]}"
+                    if len(temp_tracks) < 10:
+                        art_print_string += " "
+                    if artist[1] < 10:
+                        art_print_string += " "
+                    art_print_string += f"\t({self.tracks_added + len(temp_tracks)}/{self.max_entries})"
+                    print(art_print_string)
+                if len(temp_tracks) <= 10:
+                    self.bucketed_track_ids[len(temp_tracks) - 1].extend(temp_tracks)
+                else:
+                    self.long_track_ids.extend(temp_tracks)
+                self.tracks_added += len(temp_tracks)
+                if self.tracks_added >= self.max_entries:
+                    return True
+            else:
+                raise NoSongsFoundError(artist)
+        except GenreError as e:
+            self.consecutive_search_errors = 0
+            pg.add_skipped_genres(e.genres)
+        except OutOfTimeError:
+            # Its requests would have had to wait past the deadline, see _get_playlist_track_ids.
+            pg.skipped_for_deadline += 1
+        except SearchError as e:
+            print(f"Some error occurred when searching for {e.artist}")
+            self.consecutive_search_errors += 1
+            if self.consecutive_search_errors >= MAX_CONSECUTIVE_SEARCH_ERRORS:
+                print(f"{MAX_CONSECUTIVE_SEARCH_ERRORS} search errors in a row - "
+                      "stopping early instead of hammering a struggling API.")
+                return True
+        except ArtistNotFoundError:
+            self.consecutive_search_errors = 0
+            if pg.verbose:
+                print(f'Add {artist[0]} to failed artists')
+            pg.remove_list.append(artist[0])
+            pg.instance_fail_list.update({artist[0]: max(artist[1], pg.instance_fail_list.get(artist[1], 0))})
+            pg.bad_artist_journal.append({'name': artist[0], 'failed': pg.instance_fail_list[artist[0]]})
+        except NoSongsFoundError:
+            self.consecutive_search_errors = 0
+            if pg.verbose:
+                print(f"Found no songs for {artist[0]}.")
+            pg.remove_list.append(artist[0])
+            pg.instance_no_songs.update({artist[0]: max(artist[1], pg.instance_no_songs.get(artist[1], 0))})
+            pg.bad_artist_journal.append({'name': artist[0], 'no_songs': pg.instance_no_songs[artist[0]]})
+        return False
+
+    def track_ids(self):
+        ret = []
+        for mini_list in self.bucketed_track_ids:
+            ret.extend(mini_list)
+        return ret + self.long_track_ids
+
+
+class _ArtistRefresher:
+    """Refreshes saved_artists entries in a single background thread (see
+    Playlist_Generator.refresh_saved_artist): stale ones (see is_saved_artist_stale),
+    which keep being served as they are meanwhile, and 'full' lists a lookup stopped
+    reading early (see fetch_full_track_ids), which get read to the end. Either way a
+    refresh never holds up building the playlist.
+
+    At most `budget` entries are refreshed per run - a count of artists, not requests:
+    refreshing one takes a single request in popular mode but can read a whole
+    discography in full mode. The refreshes share the music service's request budget
+    with everything else. finish() drops whatever is still queued, which simply
+    gets queued again the next time it's served.
+    """
+
+    def __init__(self, generator, budget):
+        self.generator = generator
+        self.budget = budget
+        self.refreshed = 0
+        self._queue = None  # The running thread's, see submit.
+        self._queued = set()
+        self._thread = None
+        self._lock = threading.Lock()  # submit is called from get_track_ids' worker threads.
+
+    def submit(self, artist_name, saved_artist):
+        """Queues an entry for refreshing, unless it already was this run or the budget is spent."""
+        with self._lock:
+            if artist_name in self._queued or len(self._queued) >= self.budget:
+                return
+            self._queued.add(artist_name)
+            if self._thread is None:
+                # A queue per thread, as finish() may leave the last one to wind down on its own.
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), daemon=True)
+                self._thread.start()
+            self._queue.put((artist_name, dict(saved_artist)))
+
+    def _run(self, work):
+        pg = self.generator
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            try:
+                pg.refresh_saved_artist(*item)
+                self.refreshed += 1
+            except OutOfTimeError:
+                pass
+            except Exception as e:
+                pg.add_to_error_log(f"Could not refresh {item[0]}:")
+                pg.add_to_error_log(e)
+
+    def finish(self, wait=True):
+        """Drops the rest of the queue and lets the refresh in progress, if any, complete -
+        waiting for it unless `wait` is False, e.g. once the run is out of time.
+        """
+        if self._thread is None:
+            return
+        with self._lock:
+            while True:
+                try:
+                    self._queued.discard(self._queue.get_nowait()[0])
+                except queue.Empty:
+                    break
+            self._queue.put(None)
+            thread, self._thread = self._thread, None
+        if wait:
+            thread.join()
+        if self.generator.verbose and self.refreshed:
+            print(f"Refreshed {self.refreshed} stale artists.")
+
+
 class Playlist_Generator:
-    def __init__(self, settings):
+    def __init__(self, settings, rate_limiter=None):
+        """
+        Args:
+            settings (dict): The parsed config.yaml, see file_handler.get_config.
+            rate_limiter (RateLimiter, optional): Per-host request budget shared by the last.fm
+                calls made here and the music service. Defaults to one configured from
+                general_settings (lastfm_requests_per_second, music_service_requests_per_second,
+                music_service_max_requests_per_second and rate_limit_burst).
+        """
         self.general_settings = settings['general_settings']
         self.farming_settings = settings['farming_settings']
         self.stealing_settings = settings['stealing_settings']
         self.verbose = self.general_settings['verbose']
         self.genre_source = self.general_settings['genre_source']
+        self._genre_matcher = None  # See _compiled_genres.
+        self._prefetched_lastfm_tags = {}  # artist name -> [tag], see prefetch_lastfm_tags.
         self.popular = self.general_settings['popular']
         self.music_service_name = self.general_settings['music_service']
-        self.service_sleep_time = self.general_settings['sleep_time_music_service']
-        self.Lastfm_sleep_time = self.general_settings['sleep_time_Lastfm']
         self.own_scrobbles_cache_hours = self.general_settings['own_scrobbles_cache_hours']
+        self.own_scrobbles_full_refresh_hours = self.general_settings['own_scrobbles_full_refresh_hours']
+        self.lastfm_workers = max(1, self.general_settings['lastfm_workers'])
+        # How many artists get_track_ids looks up ahead of the one it's handling; 0 is one at a time.
+        self.track_id_lookahead = max(0, self.general_settings['track_id_lookahead'])
+        # How close (difflib ratio, 0-1) a search result must come to an artist's name, without
+        # matching it, for resolve_artist to search another spelling - see search_near_miss_percent.
+        self.search_near_miss = self.general_settings['search_near_miss_percent'] / 100
+        # Set per farm_crowns/steal_crowns run by start_deadline, see general_settings.max_runtime_seconds.
+        self.deadline = None
+        self.skipped_for_deadline = 0
+        self.lastfm_retry_policy = RetryPolicy(max_attempts=self.general_settings['lastfm_max_attempts'])
+        # Shared by every last.fm call this run, parallel workers included - see _lastfm_request.
+        self.lastfm_breaker = CircuitBreaker(failure_threshold=self.general_settings['lastfm_circuit_breaker_failures'],
+                                             reset_seconds=LASTFM_CIRCUIT_BREAKER_RESET_SECONDS)
         # In-memory cache for get_own_full_dict/get_own_scrobbles - see
         # _load_fresh_own_scrobbles_cache. Populated on first use by whichever of the
         # two is called first, regardless of whether farm_crowns or steal_crowns runs
@@ -57,16 +289,46 @@ class Playlist_Generator:
         self._own_scrobbles_full = None
         self.instance_fail_list, self.instance_no_songs = {}, {}
         self.skipped_genres = {}
+        # offline_mode 1 records every last.fm and music service answer to cassettes/, 2 replays
+        # them with no network at all (with offline_latency_ms/offline_error_percent simulated
+        # on every call), so runs can be profiled and compared reproducibly. Either way the
+        # stores start out empty, in a scratch directory: a recording then holds every request
+        # the run needs, and neither mode touches the real caches or journal.
+        self.offline_mode = self.general_settings['offline_mode']
+        self._scratch_directory = None
+        if self.offline_mode != OFFLINE_OFF:
+            self._scratch_directory = tempfile.TemporaryDirectory(prefix='offline_stores_')
+        set_store_directory(self._scratch_directory.name if self._scratch_directory is not None else '')
         self.saved_artists = get_saved_artists(self.music_service_name)
+        self.artist_index = get_artist_index(self.music_service_name)
         self.failed_artists = get_failed_artists(self.music_service_name)
         self.no_song_artists = get_no_song_artists(self.music_service_name)
         self.remove_list = []
+        # Everything resolved is journaled as it happens. saved_artists entries are moved
+        # into their store every journal_compact_every records, failed and no-song artists
+        # at the end of the run - see update_saved_artist and checkpoint.
+        self.journal_compact_every = max(1, self.general_settings['journal_compact_every'])
+        self.journal = RunJournal(store_path(journal_filename(self.music_service_name)))
+        self.bad_artist_journal = RunJournal(store_path(journal_filename(self.music_service_name, 'bad_artists')))
+        self._saved_artists_lock = threading.Lock()
+        self.saved_artist_ttl = self.general_settings['saved_artist_ttl_days'] * 86400
+        self.refresher = _ArtistRefresher(self, self.general_settings['artist_refreshes_per_run'])
 
         # Splits a pre-multi-service auth.json into auth_lastfm.json/auth_<service>.json
         # the first time this runs after upgrading. No-op if auth.json doesn't exist.
         migrate_legacy_auth_json()
 
         service_class = get_music_service_class(self.music_service_name)
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+            burst = self.general_settings['rate_limit_burst']
+            rate_limiter.configure(LASTFM_HOST, self.general_settings['lastfm_requests_per_second'], burst)
+            # The music service budget adapts to how the service responds, between a tenth of a
+            # request per second and music_service_max_requests_per_second - see TokenBucket.
+            rate_limiter.configure(service_class.API_HOST,
+                                   self.general_settings['music_service_requests_per_second'], burst,
+                                   max_rate=self.general_settings['music_service_max_requests_per_second'])
+        self.rate_limiter = rate_limiter
         required_keys = service_class.required_credential_keys()
 
         lastfm_credentials = get_lastfm_credentials()
@@ -108,6 +370,11 @@ class Playlist_Generator:
                 if generate_flag in ['Y', 'y']:
                     save_service_credentials(self.music_service_name, service_credentials)
 
+        cassette = Cassette(latency_ms=self.general_settings['offline_latency_ms'],
+                            error_percent=self.general_settings['offline_error_percent'],
+                            seed=0)
+        install_pylast_cassette(cassette, self.offline_mode)
+
         self.my_Lastfm_username = lastfm_credentials['LASTFM_USERNAME']
         self.pl_net = pl.LastFMNetwork(api_key=lastfm_credentials['LASTFM_API_KEY'],
                                        api_secret=lastfm_credentials['LASTFM_API_SECRET'],
@@ -116,80 +383,168 @@ class Playlist_Generator:
 
         self.farming_playlist = service_credentials['FARMING_PLAYLIST_ID']
         self.stealing_playlist = service_credentials['STEALING_PLAYLIST_ID']
-        self.service = service_class(service_credentials,
-                                     sleep_time=self.service_sleep_time,
-                                     verbose=self.verbose,
-                                     error_logger=self.add_to_error_log)
+        self.search_cache = SearchCache(get_search_cache(self.music_service_name),
+                                        positive_ttl=self.general_settings['search_cache_days'] * 86400,
+                                        negative_ttl=self.general_settings['search_cache_negative_days'] * 86400,
+                                        max_entries=self.general_settings['search_cache_max_entries'])
+        self.replay_journal()  # Needs search_cache, for the failed artists it recovers.
+        album_cache = AlbumCache(get_album_cache(self.music_service_name),
+                                 max_entries=self.general_settings['album_cache_max_entries'])
+        if self.offline_mode == OFFLINE_REPLAY:
+            self.service = FakeMusicService(service_credentials, cassette, self.music_service_name,
+                                            api_host=service_class.API_HOST,
+                                            rate_limiter=self.rate_limiter,
+                                            verbose=self.verbose,
+                                            error_logger=self.add_to_error_log,
+                                            album_cache=album_cache)
+        else:
+            self.service = service_class(service_credentials,
+                                         rate_limiter=self.rate_limiter,
+                                         verbose=self.verbose,
+                                         error_logger=self.add_to_error_log,
+                                         album_cache=album_cache)
+            if self.offline_mode == OFFLINE_RECORD:
+                self.service = RecordingMusicService(self.service, cassette, self.music_service_name)
 
         self.blacklist_artists = get_blacklist()
         self.opponent_list = get_opponent_list()
 
     # LastFM Stuff
+    def _lastfm_request(self, request, *args, max_attempts=None, **kwargs):
+        """Calls request(*args, **kwargs) - any pylast call - under the shared last.fm rate
+        budget, retrying transient failures with backoff per self.lastfm_retry_policy.
+
+        Other pylast errors (e.g. an unknown user) are raised straight away: retrying can't
+        help, and last.fm answering at all says it's healthy, so they don't count toward
+        tripping self.lastfm_breaker. Safe to call from several threads at once.
+
+        Args:
+            request (callable): The pylast call to make.
+            max_attempts (int, optional): Overrides the retry policy's attempt cap.
+
+        Raises:
+            LastfmUnavailableError: If the circuit breaker is open, or every attempt failed.
+        """
+        max_attempts = max_attempts or self.lastfm_retry_policy.max_attempts
+        failures = 0
+        while True:
+            if not self.lastfm_breaker.allow():
+                raise LastfmUnavailableError("too many failed requests, giving it a rest.")
+            self.rate_limiter.acquire(LASTFM_HOST)
+            try:
+                result = request(*args, **kwargs)
+            except pl.PyLastError as e:
+                if isinstance(e, pl.WSError) and str(e.get_id()) not in _TRANSIENT_LASTFM_ERRORS:
+                    self.lastfm_breaker.record_success()
+                    raise
+                self.lastfm_breaker.record_failure()
+                failures += 1
+                self.add_to_error_log(f"last.fm request failed (attempt {failures} of {max_attempts}):")
+                self.add_to_error_log(e)
+                if failures >= max_attempts:
+                    raise LastfmUnavailableError(f"gave up after {failures} attempts ({e}).")
+                time.sleep(self.lastfm_retry_policy.delay(failures))
+            else:
+                self.lastfm_breaker.record_success()
+                return result
+
     def get_user_scrobbles(self, Lastfm_username, max_scrobbles=BIG_NUMBER, min_scrobbles=1,
-                           min_artists=BIG_NUMBER, starting_page=1):
+                           min_artists=BIG_NUMBER, starting_page=1, workers=None):
         """Fetches the 1000 top artist for the logged in user and filters out those with scrobbles over the target.
         If the result is less than min_artists, the process is repeated for the next 1000 top artists.
 
+        The first page is fetched on its own to learn totalPages; the rest are fetched by a pool of
+        `workers` threads, all sharing the last.fm budget in self.rate_limiter. With one worker the
+        pages are fetched one after another on the calling thread, without a pool.
+
         Args:
             scrobble_target (int): Number of scrobbles that should be reached.
             min_artists (int, optional): The minimum number of artist fetched. Defaults to 20.
+            workers (int, optional): Pages fetched at a time. Defaults to general_settings.lastfm_workers.
 
         Returns:
             {artist: scrobbles}: A dictionary with artist as keys and number of plays needed to reach target as values.
+
+        Raises:
+            LastfmUnavailableError: If a page couldn't be fetched, see _lastfm_request.
         """
-        def find_first_entry_under_limit(group, limit):
-            """First index in `group` (sorted by descending .weight) whose weight is
-            under `limit` - the boundary between the 'weight >= limit' and
-            'weight < limit' runs. O(log n) via bisect and never reads out of range,
+        def find_first_entry_under_limit(playcounts, limit):
+            """First index in `playcounts` (sorted descending) whose count is
+            under `limit` - the boundary between the 'count >= limit' and
+            'count < limit' runs. O(log n) via bisect and never reads out of range,
             unlike the hand-rolled step search this replaces (which could stall
             forever once its fixed jump schedule rounded down to a zero-length step
             before finding the boundary - reproducibly common for
             find_last_entry_over_limit below, rarer but still possible here).
             """
-            return bisect.bisect_right(group, -limit, key=lambda a: -int(a.weight))
+            return bisect.bisect_right(playcounts, -limit, key=operator.neg)
 
-        def find_last_entry_over_limit(group, limit):
-            """Last index in `group` (sorted by descending .weight) whose weight is
+        def find_last_entry_over_limit(playcounts, limit):
+            """Last index in `playcounts` (sorted descending) whose count is
             still >= limit - one before the same boundary found by
             find_first_entry_under_limit.
             """
-            return bisect.bisect_right(group, -limit, key=lambda a: -int(a.weight)) - 1
+            return bisect.bisect_right(playcounts, -limit, key=operator.neg) - 1
 
         Lastfm_user = pl_User(Lastfm_username, self.pl_net)
-        page_no = starting_page
         ret = {}
-        # while len(ret.keys()) < min_artists:
-        while True:
-            try:
-                top_artists = Lastfm_user.get_top_artists(limit=512, page=page_no)
-                time.sleep(self.Lastfm_sleep_time)
-            except pl.WSError as e:
-                if e.details == "Connection to the API failed with HTTP code 500":
-                    time.sleep(10)
-                else:
-                    self.add_to_error_log("Here follows an error from pyLast. I want to be able to handle it:", True)
-                    self.add_to_error_log(e, True)
-                    time.sleep(10)
+
+        def fetch_page(page_no):
+            return self._lastfm_request(Lastfm_user.get_top_artist_playcounts, limit=512, page=page_no)
+
+        def process_page(names, playcounts):
+            """Adds the page's in-range artists to ret. Pages must be fed in page order.
+
+            Returns:
+                bool: True once the crawl has reached its end - either last.fm ran out
+                      of artists or this page crossed under min_scrobbles.
+            """
+            if not len(playcounts):  # Failsafe, just in case all artists have been fetched.
+                return True
+            if playcounts[-1] >= max_scrobbles:
+                return False
+            if max_scrobbles > playcounts[0]:
+                bottom_index = 0
             else:
-                if len(top_artists):  # Failsafe, just in case all artists have been fetched.
-                    if int(top_artists[-1].weight) >= max_scrobbles:
-                        page_no += 1
-                    else:
-                        if max_scrobbles > int(top_artists[0].weight):
-                            bottom_index = 0
-                        else:
-                            bottom_index = find_first_entry_under_limit(top_artists, max_scrobbles)
-                        if int(top_artists[-1].weight) >= min_scrobbles:
-                            ret.update({a.item.get_name(): int(a.weight) for a in top_artists[bottom_index:]})
-                            page_no += 1
-                        else:
-                            # find_last_entry_over_limit returns the last INCLUSIVE index
-                            # over the limit, but the slice below needs an exclusive end -
-                            # +1 here keeps that artist in the result instead of dropping it.
-                            top_index = find_last_entry_over_limit(top_artists, min_scrobbles) + 1
-                            ret.update({a.item.get_name(): int(a.weight) for a in top_artists[bottom_index:top_index]})
-                            break
-                else:
+                bottom_index = find_first_entry_under_limit(playcounts, max_scrobbles)
+            if playcounts[-1] >= min_scrobbles:
+                ret.update(zip(names[bottom_index:], playcounts[bottom_index:]))
+                return False
+            # find_last_entry_over_limit returns the last INCLUSIVE index
+            # over the limit, but the slice below needs an exclusive end -
+            # +1 here keeps that artist in the result instead of dropping it.
+            top_index = find_last_entry_over_limit(playcounts, min_scrobbles) + 1
+            ret.update(zip(names[bottom_index:top_index], playcounts[bottom_index:top_index]))
+            return True
+
+        names, playcounts, total_pages = fetch_page(starting_page)
+        if process_page(names, playcounts) or starting_page >= total_pages:
+            return ret
+
+        workers = workers or self.lastfm_workers
+        if workers <= 1:
+            for page_no in range(starting_page + 1, total_pages + 1):
+                names, playcounts, _ = fetch_page(page_no)
+                if process_page(names, playcounts):
+                    break
+            return ret
+
+        # The first page told us how many there are, so the rest can be fetched in
+        # parallel. Pages are still *processed* strictly in order, and at most
+        # `workers` pages are ever in flight, so once a page crosses the
+        # min_scrobbles cut-off nothing further past it gets requested - the pages
+        # already in flight are the only overshoot.
+        next_page = starting_page + 1
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while next_page <= total_pages or in_flight:
+                while next_page <= total_pages and len(in_flight) < workers:
+                    in_flight.append(pool.submit(fetch_page, next_page))
+                    next_page += 1
+                names, playcounts, _ = in_flight.popleft().result()
+                if process_page(names, playcounts):
+                    for future in in_flight:
+                        future.cancel()
                     break
         return ret
 
@@ -213,6 +568,64 @@ class Playlist_Generator:
         self._own_scrobbles_full = cached['data']
         return self._own_scrobbles_full
 
+    def _refresh_own_scrobbles_cache_incrementally(self):
+        """Brings a stale own_scrobbles_cache.json up to date by adding only the scrobbles
+        made since its 'timestamp' (user.getRecentTracks with `from`) - usually a page or
+        two - instead of re-crawling the whole library. The window ends when the refresh
+        starts, which becomes the new 'timestamp': scrobbles made meanwhile neither shift
+        the pages being read nor get counted twice, they're left for the next refresh.
+
+        Only done while the last *full* crawl ('full_timestamp') is younger than
+        general_settings.own_scrobbles_full_refresh_hours. Past that, or if there's no
+        cache at all, this returns None and the caller does a full crawl, which also
+        reconciles anything an incremental update can't see (deleted scrobbles, artist
+        renames, scrobbles submitted late with a timestamp before the last refresh).
+
+        Returns:
+            {artist: scrobbles} or None: The refreshed snapshot, also saved to disk.
+
+        Raises:
+            LastfmUnavailableError: See _lastfm_request.
+        """
+        cached = get_own_scrobbles_cache()
+        if cached is None:
+            return None
+        full_timestamp = cached.get('full_timestamp', cached['timestamp'])
+        if (time.time() - full_timestamp) / 3600 >= self.own_scrobbles_full_refresh_hours:
+            return None
+        if self.verbose:
+            print("## Updating own scrobbles with recent plays ##")
+        Lastfm_user = pl_User(self.my_Lastfm_username, self.pl_net)
+        refresh_time = int(time.time())
+        data = cached['data']
+        page_no, total_pages = 1, 1
+        while page_no <= total_pages:
+            try:
+                artists, total_pages = self._lastfm_request(Lastfm_user.get_recent_artist_scrobbles,
+                                                            cached['timestamp'], refresh_time, page=page_no)
+            except pl.WSError as e:
+                self.add_to_error_log("Could not fetch recent scrobbles, doing a full fetch instead:", True)
+                self.add_to_error_log(e, True)
+                return None
+            for artist in artists:
+                data[artist] = data.get(artist, 0) + 1
+            page_no += 1
+        self._own_scrobbles_full = data
+        save_own_scrobbles_cache(refresh_time, data, full_timestamp)
+        return data
+
+    def _load_stale_own_scrobbles_cache(self, error):
+        """Last resort when last.fm is unavailable: the on-disk snapshot however old it
+        is, so a playlist can still be made. None if there's no snapshot at all.
+        """
+        cached = get_own_scrobbles_cache()
+        if cached is None:
+            return None
+        saved_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(cached['timestamp']))
+        self.add_to_error_log(f"{error.message} Using own scrobbles saved {saved_at} instead.", True)
+        self._own_scrobbles_full = cached['data']
+        return self._own_scrobbles_full
+
     def get_own_full_dict(self):
         """Fetches all top artist for the logged in user.
 
@@ -220,7 +633,9 @@ class Playlist_Generator:
         run) if it's younger than general_settings.own_scrobbles_cache_hours, instead
         of re-crawling all of last.fm - get_own_scrobbles reads the same cache, so
         whichever of the two runs first in a given process does the one full fetch
-        and the other reuses it for free.
+        and the other reuses it for free. An older snapshot is topped up with just the
+        recent scrobbles where possible, see _refresh_own_scrobbles_cache_incrementally,
+        and is used as-is if last.fm is unavailable.
 
         Returns:
             {artist: scrobbles}: A dictionary with artist as keys and scrobbles as values.
@@ -228,18 +643,31 @@ class Playlist_Generator:
         cached = self._load_fresh_own_scrobbles_cache()
         if cached is not None:
             return cached
-        data = self.get_user_scrobbles(Lastfm_username=self.my_Lastfm_username)
+        try:
+            refreshed = self._refresh_own_scrobbles_cache_incrementally()
+            if refreshed is not None:
+                return refreshed
+            data = self.get_user_scrobbles(Lastfm_username=self.my_Lastfm_username)
+            # Taken once the crawl is done: scrobbles made during it may already be in its
+            # totals, so the next incremental refresh mustn't add them again.
+            crawl_time = int(time.time())
+        except LastfmUnavailableError as e:
+            stale = self._load_stale_own_scrobbles_cache(e)
+            if stale is None:
+                raise
+            return stale
         self._own_scrobbles_full = data
-        save_own_scrobbles_cache(int(time.time()), data)
+        save_own_scrobbles_cache(crawl_time, data)
         return data
 
     def get_own_scrobbles(self, scrobble_target, min_artists=1000, starting_page=1):
         """Fetches the 1000 top artist for the logged in user and filters out those with scrobbles over the target.
         If the result is less than min_artists, the process is repeated for the next 1000 top artists.
 
-        If a fresh full-library snapshot is already available (see get_own_full_dict),
-        it's filtered locally instead of hitting last.fm again; otherwise this falls
-        back to its own bounded fetch exactly as before.
+        If a fresh full-library snapshot is already available, or a stale one can be
+        refreshed incrementally (see get_own_full_dict), it's filtered locally instead
+        of hitting last.fm again; otherwise this falls back to its own bounded fetch
+        exactly as before.
 
         Args:
             scrobble_target (int): Number of scrobbles that should be reached.
@@ -249,23 +677,94 @@ class Playlist_Generator:
         Returns:
             {artist: scrobbles}: A dictionary with artist as keys and number of plays needed to reach target as values.
         """
-        cached = self._load_fresh_own_scrobbles_cache()
-        if cached is not None:
-            return {artist: plays for artist, plays in cached.items() if plays < scrobble_target}
-        return self.get_user_scrobbles(Lastfm_username=self.my_Lastfm_username,
-                                       max_scrobbles=scrobble_target,
-                                       min_artists=min_artists,
-                                       starting_page=starting_page)
-
-    def get_opponent_scrobbles(self, opponent_Lastfm_username, scrobble_target=30):
+        try:
+            cached = self._load_fresh_own_scrobbles_cache()
+            if cached is None:
+                cached = self._refresh_own_scrobbles_cache_incrementally()
+            if cached is None:
+                return self.get_user_scrobbles(Lastfm_username=self.my_Lastfm_username,
+                                               max_scrobbles=scrobble_target,
+                                               min_artists=min_artists,
+                                               starting_page=starting_page)
+        except LastfmUnavailableError as e:
+            cached = self._load_stale_own_scrobbles_cache(e)
+            if cached is None:
+                raise
+        return {artist: plays for artist, plays in cached.items() if plays < scrobble_target}
+
+    def get_opponent_scrobbles(self, opponent_Lastfm_username, scrobble_target=30, workers=None):
         """Fetches the top artists for the specified user that are over or equal to the target.
 
+        Args:
+            workers (int, optional): Pages fetched at a time, see get_user_scrobbles.
+
         Returns:
             {artist: scrobbles}: A dictionary with artist as keys and scrobbles as values.
         """
         return self.get_user_scrobbles(Lastfm_username=opponent_Lastfm_username,
                                        min_scrobbles=scrobble_target,
-                                       starting_page=1)
+                                       starting_page=1,
+                                       workers=workers)
+
+    def refresh_opponent_snapshots(self, scrobble_target=30):
+        """Returns one cached snapshot per opponent in opponent_list.txt, re-fetching only the
+        ones should_opp_scrobbles_be_reused rejects (stale, fetched for a higher crown_goal, or
+        new to the list). Those are fetched concurrently and saved as they come in. The opponents
+        and the pages of each opponent's library share general_settings.lastfm_workers threads
+        between them (and the last.fm budget), rather than every opponent opening a pool of its own.
+
+        Opponents no longer in the list are simply dropped, without any network calls. If a
+        fetch fails (or last.fm is unavailable altogether, see _lastfm_request), the opponent's
+        old snapshot is used however stale it is, else the opponent is left out.
+
+        Returns:
+            {opponent: {'timestamp': int, 'crown_goal': int, 'data': {artist: scrobbles}}}
+        """
+        saved = get_opponent_snapshots()
+        snapshots = {opponent: saved[opponent] for opponent in self.opponent_list
+                     if self.should_opp_scrobbles_be_reused(saved.get(opponent))}
+        to_fetch = [opponent for opponent in self.opponent_list if opponent not in snapshots]
+        if self.verbose:
+            if snapshots:
+                print(f"## Reusing previous scrobbles for {len(snapshots)} of {len(self.opponent_list)} opponents ##")
+            if to_fetch:
+                print(f"## Downloading scrobbles for {len(to_fetch)} opponents ##")
+        opponent_workers = max(1, min(self.lastfm_workers, len(to_fetch)))
+        page_workers = max(1, self.lastfm_workers // opponent_workers)
+        with ThreadPoolExecutor(max_workers=opponent_workers) as pool:
+            futures = {pool.submit(self.get_opponent_scrobbles, opponent, scrobble_target, page_workers): opponent
+                       for opponent in to_fetch}
+            for done, future in enumerate(as_completed(futures), 1):
+                opponent = futures[future]
+                try:
+                    snapshots[opponent] = {'timestamp': int(time.time()),
+                                           'crown_goal': scrobble_target,
+                                           'data': future.result()}
+                    status = "done"
+                except (pl.PyLastError, LastfmUnavailableError) as e:
+                    status = "FAILED"
+                    self.add_to_error_log(f"Could not fetch scrobbles for opponent {opponent}:", True)
+                    self.add_to_error_log(e, True)
+                    if opponent in saved:
+                        status += ", using previous snapshot"
+                        snapshots[opponent] = saved[opponent]
+                if self.verbose:
+                    print(f"\tOpponent {opponent} {status} ({done} of {len(to_fetch)})")
+                save_opponent_snapshots(snapshots)
+        return snapshots
+
+    def merge_opponent_snapshots(self, snapshots):
+        """Merges opponent snapshots into a single {artist: scrobbles}, keeping each artist's
+        highest count. Merged in opponent_list order, so the result (key order included) is
+        the same however the snapshots were obtained.
+        """
+        top_artists = {}
+        for opponent in self.opponent_list:
+            if opponent not in snapshots:
+                continue
+            for artist, scrobbles in snapshots[opponent]['data'].items():
+                top_artists.update({artist: max(scrobbles, top_artists.get(artist, 0))})
+        return top_artists
 
     def get_lastfm_artist_genres(self, artist_name, limit=10):
         """Fetches an artist's top user-submitted tags from last.fm, used as a genre substitute.
@@ -275,30 +774,87 @@ class Playlist_Generator:
             limit (int, optional): Max number of tags to fetch. Defaults to 10.
 
         Returns:
-            [str]: A list of tag names. Empty if last.fm has none, or the artist was not found.
+            [str] or None: A list of tag names. Empty if last.fm has none, or the artist was not
+                found. None if last.fm couldn't be asked (see _lastfm_request) - that says nothing
+                about the artist, so it isn't to be stored.
         """
         try:
-            top_tags = pl.Artist(artist_name, self.pl_net).get_top_tags(limit=limit)
-            time.sleep(self.Lastfm_sleep_time)
+            top_tags = self._lastfm_request(pl.Artist(artist_name, self.pl_net).get_top_tags,
+                                            limit=limit, max_attempts=1)
         except pl.WSError as e:
+            self.add_to_error_log(f"last.fm has no tags for {artist_name}:", True)
+            self.add_to_error_log(e, True)
+            return []
+        except LastfmUnavailableError as e:
             if self.verbose:
                 print(f"last.fm tag lookup failed for {artist_name}")
             self.add_to_error_log(f"last.fm tag lookup failed for {artist_name}:", True)
             self.add_to_error_log(e, True)
-            return []
+            return None
         return [tag.item.get_name() for tag in top_tags]
+
+    def prefetch_lastfm_tags(self, top_artists):
+        """With genre_source LastFM and a genres filter, fetches the tags of the first
+        general_settings.lastfm_tag_prefetch_artists candidates that have none yet, all at
+        once (lastfm_workers at a time, under the shared last.fm budget), instead of one
+        blocking round trip per artist while get_track_ids works through them.
+
+        Tags for artists already in saved_artists are stored there straight away; the rest
+        are kept until get_relevant_artist_genres creates their entries. Stops starting new
+        fetches once the run's deadline (see start_deadline) has passed.
+
+        Returns:
+            int: The number of artists whose tags were fetched.
+        """
+        if self.genre_source != 'LastFM' or not len(self.genres):
+            return 0
+        to_fetch = []
+        for artist in top_artists[:self.general_settings['lastfm_tag_prefetch_artists']]:
+            try:
+                if len(self.saved_artists[artist[0]]['genres_lastfm']):
+                    continue
+            except KeyError:
+                pass
+            if artist[0] not in self._prefetched_lastfm_tags:
+                to_fetch.append(artist[0])
+        if not to_fetch:
+            return 0
+        if self.verbose:
+            print(f"## Fetching last.fm tags for {len(to_fetch)} artists ##")
+
+        def fetch_tags(artist_name):
+            return None if self.deadline_passed() else self.get_lastfm_artist_genres(artist_name)
+
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.lastfm_workers) as pool:
+            for artist_name, tags in zip(to_fetch, pool.map(fetch_tags, to_fetch)):
+                if tags is None:
+                    continue  # Out of time, or last.fm couldn't be asked - nothing to store.
+                fetched += 1
+                try:
+                    saved_artist = self.saved_artists[artist_name]
+                except KeyError:
+                    self._prefetched_lastfm_tags[artist_name] = tags
+                    continue
+                saved_artist['genres_lastfm'] = tags or ['+ NO GENRE +']
+                saved_artist.pop('genre_match', None)
+                self.update_saved_artist(artist_name, saved_artist)
+        return fetched
     # End LastFM stuff
 
     # Playlist stuff
     def _get_skip_artists(self):
         """Returns the set of artist names that should never be added to a playlist:
-        the user's blacklist, plus artists already known (from a previous run) to
-        fail search or have no matching songs on the active music service.
+        the user's blacklist, artists already known (from a previous run) to have no
+        matching songs on the active music service, and failed artists - ones no search
+        found - for as long as that outcome is cached (see SearchCache). Once it expires
+        they get another chance.
 
         A set rather than a list so `artist not in skip_artists` (farm_crowns) is
         O(1) instead of an O(n) scan per artist.
         """
-        return set(self.blacklist_artists) | self.failed_artists.keys() | self.no_song_artists.keys()
+        not_found = {artist for artist in self.failed_artists if self.search_cache.get(artist) == (None, None)}
+        return set(self.blacklist_artists) | self.no_song_artists.keys() | not_found
 
     def farm_crowns(self):
         """Populates the 'Farming playlist' with enough plays to reach target for each artist.
@@ -308,6 +864,7 @@ class Playlist_Generator:
             scrobble_target (int, optional): The target number of scrobbles per artist. Defaults to 30.
             number_of_tracks (int, optional): Number of songs to be added to playlist. Defaults to 500.
         """
+        self.start_deadline()
         scrobble_target = self.farming_settings['crown_goal']
         self.genres = self.farming_settings['genres']
         # 0 means "no cap" in config.yaml - substitute BIG_NUMBER so min(artist[1], ...)
@@ -319,14 +876,12 @@ class Playlist_Generator:
         skip_artists = self._get_skip_artists()
         top_artists = [[key, scrobble_target - value] for key, value in top_artists.items() if key not in skip_artists]
         try:
-            track_ids = self.get_track_ids(top_artists, self.farming_settings['playlist_length'])
+            track_ids = self._get_playlist_track_ids(top_artists, self.farming_settings['playlist_length'])
         finally:
-            self.update_bad_artists()
-            self.save_local_artist_info()
-            self.save_failed_artists()
-            self.save_no_song_artists()
-        self.service.empty_playlist(self.farming_playlist)
-        self.service.add_to_playlist(track_ids, self.farming_playlist)
+            self.refresher.finish(wait=not self.deadline_passed())
+            self.checkpoint()
+        self.service.sync_playlist(track_ids, self.farming_playlist)
+        self.report_deadline()
         self.farming_settings['last_run'] = int(time.strftime('%j'))
         self.do_exit_stuff()
         return True
@@ -339,47 +894,52 @@ class Playlist_Generator:
             scrobble_target (int, optional): Lower scrobble limit of opponent entries to target. Defaults to 30.
             number_of_tracks (int, optional): Number of songs to be added to playlist. Defaults to 500.
         """
+        self.start_deadline()
         if self.verbose:
             print("\n## Generating list for stealing others crowns ##")
         self.genres = self.stealing_settings['genres']
         self.max_songs_per_artist = self.stealing_settings['max_songs_per_artist'] or BIG_NUMBER
         scrobble_target = self.stealing_settings['crown_goal']
         number_of_tracks = self.stealing_settings['playlist_length']
-        reuse = self.should_opp_scrobbles_be_reused()
-        if reuse:
-            if self.verbose:
-                print("## Reusing previous opponent scrobbles ##")
-            try:
-                with open('opponent_scrobbles.json', 'r', encoding='UTF-8') as opp:
-                    top_artists = json.load(opp)
-                if not len(top_artists):
-                    self.add_to_error_log("Old list empty, getting new instead.", True)
-                    reuse = False
-            except FileNotFoundError:
-                self.add_to_error_log("No previous opponent scrobbles found, getting new instead.", True)
-                reuse = False
-        if not reuse:
-            if self.verbose:
-                print("## Downloading opponent scrobbles ##")
-                print(f"\tOpponent 1 of {len(self.opponent_list)}")
-            top_artists = self.get_opponent_scrobbles(self.opponent_list[0], scrobble_target)
-            for i in range(1, len(self.opponent_list)):
-                opponent = self.opponent_list[i]
-                if self.verbose:
-                    print(f"\tOpponent {i+1} of {len(self.opponent_list)}")
-                opponent_dict = self.get_opponent_scrobbles(opponent, scrobble_target)
-                for artist, scrobbles in opponent_dict.items():
-                    top_artists.update({artist: max(scrobbles, top_artists.get(artist, 0))})
-            if self.verbose:
-                print("All opponents fetched.")
-            skip_artists = self._get_skip_artists()
-            for artist in skip_artists:
-                top_artists.pop(artist, None)
-            with open('opponent_scrobbles.json', 'w', encoding='UTF-8') as opp:
-                json.dump(top_artists, opp)
+        snapshots = self.refresh_opponent_snapshots(scrobble_target)
+        top_artists = self.merge_opponent_snapshots(snapshots)
+        skip_artists = self._get_skip_artists()
+        for artist in skip_artists:
+            top_artists.pop(artist, None)
 
         my_top_artists = self.get_own_full_dict()
+        top_artists_list = self.get_steal_targets(top_artists, my_top_artists, scrobble_target)
+        try:
+            track_ids = self._get_playlist_track_ids(top_artists_list, number_of_tracks)
+        finally:
+            self.refresher.finish(wait=not self.deadline_passed())
+            self.checkpoint()
+
+        self.service.sync_playlist(track_ids, self.stealing_playlist)
+        self.report_deadline()
+        if len(self.remove_list):
+            for snapshot in snapshots.values():
+                for artist in self.remove_list:
+                    snapshot['data'].pop(artist, None)
+            save_opponent_snapshots(snapshots)
+        self.stealing_settings['last_run'] = int(time.strftime('%j'))
+        self.do_exit_stuff()
+        return True
+
+    def get_steal_targets(self, top_artists, my_top_artists, scrobble_target):
+        """Diffs the merged opponent scrobbles against this account's own.
 
+        Artists already ahead of every opponent are added to self.remove_list, and with
+        stealing_settings.overtake, artists never played are left out.
+
+        Args:
+            top_artists ({artist: scrobbles}): The opponents' highest counts, see merge_opponent_snapshots.
+            my_top_artists ({artist: scrobbles}): This account's counts, see get_own_full_dict.
+            scrobble_target (int): Opponent counts under this are ignored.
+
+        Returns:
+            [[str, int]]: Artist names and the plays needed to overtake, fewest first.
+        """
         top_artists_list = []
         for artist, scrobbles in top_artists.items():
             if scrobbles >= scrobble_target:
@@ -393,48 +953,50 @@ class Playlist_Generator:
                     self.remove_list.append(artist)
 
         top_artists_list.sort(key=lambda x: x[1])
-        try:
-            track_ids = self.get_track_ids(top_artists_list, number_of_tracks)
-        finally:
-            self.update_bad_artists()
-            self.save_local_artist_info()
-            self.save_failed_artists()
-            self.save_no_song_artists()
-
-        self.service.empty_playlist(self.stealing_playlist)
-        self.service.add_to_playlist(track_ids, self.stealing_playlist)
-        if len(self.remove_list):
-            for artist in self.remove_list:
-                try:
-                    top_artists.pop(artist)
-                except KeyError:
-                    continue
-            with open('opponent_scrobbles.json', 'w', encoding='UTF-8') as opp:
-                json.dump(top_artists, opp)
-        if not reuse:
-            self.stealing_settings['last_opponent_save'] = int(time.strftime('%j'))
-            self.stealing_settings['saved_opponent_goal'] = self.stealing_settings['crown_goal']
-        self.stealing_settings['last_run'] = int(time.strftime('%j'))
-        self.do_exit_stuff()
-        return True
+        return top_artists_list
     # End Playlist stuff
 
     def clean_string(self, input_string):
         string_to_clean = input_string.lower()
         return string_to_clean
 
+    def _compiled_genres(self):
+        """self.genres as a GenreMatcher, compiled again only when self.genres is replaced."""
+        if self._genre_matcher is None or self._genre_matcher.genres is not self.genres:
+            self._genre_matcher = GenreMatcher(self.genres, self.genre_source)
+        return self._genre_matcher
+
     def check_genres(self, artist_genres):
-        wanted_genres = self.genres
-        for genre in wanted_genres:
-            if genre[0] == '+':
-                for genre2 in artist_genres:
-                    if genre.lower() == genre2.lower():
-                        return True
-            else:
-                for genre2 in artist_genres:
-                    if genre.lower() in genre2.lower():
-                        return True
-        return False
+        return self._compiled_genres().matches(artist_genres)
+
+    def artist_matches_genres(self, artist_name, saved_artist):
+        """check_genres for a saved artist, remembered in its entry as 'genre_match':
+        {GenreMatcher.key: result} for the last GENRE_MATCH_MEMO_SIZE genre configurations
+        - so farming and stealing each match the artist once, until their genres config or
+        the artist's genres change.
+
+        The memo isn't journaled (see update_saved_artist): a crash loses nothing that
+        can't be worked out again without a request.
+
+        Returns:
+            (bool, [str]): Whether the artist is wanted, and its genres.
+        """
+        artist_genres = self.get_relevant_artist_genres(artist_name, saved_artist)
+        if artist_genres is None:
+            return False, []  # Unknown this time, and nothing remembered - see get_relevant_artist_genres.
+        matcher = self._compiled_genres()
+        memo = saved_artist.get('genre_match')
+        if not isinstance(memo, dict):
+            memo = {}  # Entries from before it held more than one configuration.
+        if matcher.key in memo:
+            return memo[matcher.key], artist_genres
+        matches = matcher.matches(artist_genres)
+        memo[matcher.key] = matches
+        while len(memo) > GENRE_MATCH_MEMO_SIZE:
+            del memo[next(iter(memo))]
+        saved_artist['genre_match'] = memo
+        self.update_saved_artist(artist_name, saved_artist, journal=False)
+        return matches, artist_genres
 
     def get_relevant_artist_genres(self, artist_name, saved_artist):
         """Returns the cached genre/tag list for whichever source general_settings.genre_source
@@ -453,29 +1015,47 @@ class Playlist_Generator:
             saved_artist (dict): That artist's saved_artists entry.
 
         Returns:
-            [str]: The artist's genres/tags for the configured source. Never empty -
-                   '+ NO GENRE +' is used as a placeholder so a lookup isn't repeated.
+            [str] or None: The artist's genres/tags for the configured source. Never empty -
+                   '+ NO GENRE +' is used as a placeholder so a lookup isn't repeated. None if
+                   the last.fm tags couldn't be fetched; nothing is stored then, so they're
+                   fetched again next time.
         """
         genre_key = 'genres_spotify' if self.genre_source == 'Spotify' else 'genres_lastfm'
         if not len(saved_artist[genre_key]):
             if self.genre_source == 'LastFM':
-                saved_artist[genre_key] = self.get_lastfm_artist_genres(artist_name)
+                tags = self._prefetched_lastfm_tags.pop(artist_name, None)  # See prefetch_lastfm_tags.
+                if tags is None:
+                    tags = self.get_lastfm_artist_genres(artist_name)
+                if tags is None:
+                    return None
+                saved_artist[genre_key] = tags
             if not len(saved_artist[genre_key]):
                 saved_artist[genre_key] = ['+ NO GENRE +']
-            self.saved_artists.update({artist_name: saved_artist})
+            saved_artist.pop('genre_match', None)  # Matched against the genres it had before.
+            self.update_saved_artist(artist_name, saved_artist)
         return saved_artist[genre_key]
 
     def filter_tracks(self, artist_name, tracks):
         artist_name = self.clean_string(artist_name)
         return [track for track in tracks if self.clean_string(track.artist_name) == artist_name]
 
-    def get_artist_track_ids(self, artist):
+    def get_artist_track_ids(self, artist, searches=None):
         try:
             saved_artist = self.saved_artists[artist[0]]
             if self.genre_source is not None and len(self.genres):
-                artist_genres = self.get_relevant_artist_genres(artist[0], saved_artist)
-                if not self.check_genres(artist_genres):
+                matches, artist_genres = self.artist_matches_genres(artist[0], saved_artist)
+                if not matches:
                     raise GenreError(artist_genres)
+            needed = min(artist[1], self.max_songs_per_artist)
+            if self.is_saved_artist_stale(saved_artist):
+                if self._lacks_tracks(saved_artist, needed):
+                    # Its tracks are fetched right now either way, so it's refreshed right now.
+                    saved_artist = self.refresh_saved_artist(artist[0], saved_artist, needed)
+                    if not self.popular and not saved_artist['full_complete']:
+                        self.refresher.submit(artist[0], saved_artist)
+                else:
+                    # Served as it is for now - see _ArtistRefresher.
+                    self.refresher.submit(artist[0], saved_artist)
             if self.popular:
                 if not len(saved_artist['popular']):
                     try:
@@ -484,67 +1064,273 @@ class Playlist_Generator:
                         search_name = artist[0]
                     tracks = self.filter_tracks(search_name, self.service.get_artist_top_tracks(saved_artist["uri"]))
                     saved_artist['popular'] = [track.id for track in tracks]
-                    self.saved_artists.update({artist[0]: saved_artist})
-                return saved_artist['popular'][:min(artist[1], self.max_songs_per_artist)]
+                    self.update_saved_artist(artist[0], saved_artist)
+                return saved_artist['popular'][:needed]
             else:
-                if not len(saved_artist['full']):
-                    try:
-                        search_name = saved_artist['search_name']
-                    except KeyError:
-                        search_name = artist[0]
-                    tracks = self.filter_tracks(search_name, self.service.get_artist_all_tracks(saved_artist["uri"]))
-                    tracks = {track.name: track for track in tracks}
-                    sorted_tracks = sorted(tracks.values(), key=lambda t: t.duration_ms)
-                    saved_artist['full'] = [track.id for track in sorted_tracks]
-                    self.saved_artists.update({artist[0]: saved_artist})
-                return saved_artist['full'][:min(artist[1], self.max_songs_per_artist)]
+                if self._lacks_tracks(saved_artist, needed):
+                    self.fetch_full_track_ids(saved_artist, saved_artist.get('search_name', artist[0]), needed)
+                    self.update_saved_artist(artist[0], saved_artist)
+                    if not saved_artist['full_complete']:
+                        self.refresher.submit(artist[0], saved_artist)
+                return saved_artist['full'][:needed]
         except KeyError:
-            search_name_methods = [lambda x: x,
-                                   lambda x: x.replace(' and ', ' & ').replace(' och ', ' & '),
-                                   lambda x: x.lower(),
-                                   lambda x: x.upper(),
-                                   lambda x: ''.join(c for c in x if c.isalnum())]
-            for search_name_method in search_name_methods:
-                try:
-                    search_name = search_name_method(artist[0])
-                    search_results = self.service.search_artist(search_name)
-                    for result in search_results:
-                        if self.clean_string(result.name) == self.clean_string(search_name):
-                            artist_dict = {'full': [],
-                                           'popular': [],
-                                           'uri': result.id,
-                                           'genres_spotify': result.genres,
-                                           'genres_lastfm': [],
-                                           'date': int(time.strftime('%j')),
-                                           'search_name': search_name}
-                            self.saved_artists.update({artist[0]: artist_dict})
-                            if self.genre_source is not None and len(self.genres):
-                                artist_genres = self.get_relevant_artist_genres(artist[0], artist_dict)
-                                if not self.check_genres(artist_genres):
-                                    raise GenreError(artist_genres)
-                            if self.popular:
-                                tracks = self.filter_tracks(search_name, self.service.get_artist_top_tracks(artist_dict['uri']))
-                                track_ids = [track.id for track in tracks]
-                                artist_dict['popular'] = track_ids
-                            else:
-                                tracks = self.filter_tracks(search_name, self.service.get_artist_all_tracks(artist_dict['uri']))
-                                tracks = {track.name: track for track in tracks}
-                                sorted_tracks = sorted(tracks.values(), key=lambda t: t.duration_ms)
-                                track_ids = [track.id for track in sorted_tracks]
-                                artist_dict['full'] = track_ids
-                            self.saved_artists.update({artist[0]: artist_dict})
-                            return track_ids[:min(artist[1], self.max_songs_per_artist)]
-                except (IndexError, TypeError):
-                    # Should this be search-error?
-                    # Is this even reached?
-                    print("### I am here ###")
-                    raise ArtistNotFoundError(artist)
+            result, search_name = self.resolve_artist(artist, searches)
+            artist_dict = {'full': [],
+                           'full_complete': False,
+                           'popular': [],
+                           'uri': result.id,
+                           'genres_spotify': result.genres,
+                           'genres_lastfm': [],
+                           'timestamp': int(time.time()),
+                           'search_name': search_name}
+            self.update_saved_artist(artist[0], artist_dict)
+            if self.genre_source is not None and len(self.genres):
+                matches, artist_genres = self.artist_matches_genres(artist[0], artist_dict)
+                if not matches:
+                    raise GenreError(artist_genres)
+            if self.popular:
+                tracks = self.filter_tracks(search_name, self.service.get_artist_top_tracks(artist_dict['uri']))
+                track_ids = [track.id for track in tracks]
+                artist_dict['popular'] = track_ids
             else:
+                track_ids = self.fetch_full_track_ids(artist_dict, search_name,
+                                                      min(artist[1], self.max_songs_per_artist))
+            self.update_saved_artist(artist[0], artist_dict)
+            if not self.popular and not artist_dict['full_complete']:
+                self.refresher.submit(artist[0], artist_dict)
+            return track_ids[:min(artist[1], self.max_songs_per_artist)]
+
+    def is_saved_artist_stale(self, saved_artist):
+        """Whether a saved_artists entry is older than general_settings.saved_artist_ttl_days.
+        Entries saved before they had a timestamp count as stale.
+        """
+        return time.time() - saved_artist.get('timestamp', 0) >= self.saved_artist_ttl
+
+    def _lacks_tracks(self, saved_artist, needed):
+        """Whether a saved_artists entry holds fewer than `needed` tracks for the current mode
+        when more could be fetched.
+        """
+        if self.popular:
+            return not saved_artist['popular']
+        # Entries saved before full_complete existed hold either nothing or everything.
+        complete = saved_artist.get('full_complete', bool(saved_artist['full']))
+        return len(saved_artist['full']) < needed and not complete
+
+    def refresh_saved_artist(self, artist_name, saved_artist, needed=BIG_NUMBER):
+        """Brings an entry's track list for the current mode (popular or full) up to date, and
+        stores the result as a new entry - see _ArtistRefresher, which calls this, and
+        get_artist_track_ids, which does when a stale entry's tracks have to be fetched anyway.
+
+        A stale entry is re-fetched and timestamped now; the other mode's list is emptied, to
+        be re-fetched whenever it's next needed. A 'full' list is read until `needed` tracks
+        are in hand (see fetch_full_track_ids) - by default to the end, which for a list that
+        was only partly read comes mostly from the album cache, as the releases read the first
+        time are in it.
+
+        Returns:
+            dict: The new entry.
+        """
+        refreshed = dict(saved_artist)
+        refreshed.pop('date', None)  # The day-of-year 'timestamp' replaced.
+        stale = self.is_saved_artist_stale(saved_artist)
+        if stale:
+            refreshed.update(popular=[], full=[], full_complete=False)
+        search_name = saved_artist.get('search_name', artist_name)
+        if self.popular:
+            tracks = self.filter_tracks(search_name, self.service.get_artist_top_tracks(saved_artist['uri']))
+            refreshed['popular'] = [track.id for track in tracks]
+        else:
+            self.fetch_full_track_ids(refreshed, search_name, needed)
+        if stale:
+            refreshed['timestamp'] = int(time.time())
+        self.update_saved_artist(artist_name, refreshed)
+        return refreshed
+
+    def fetch_full_track_ids(self, saved_artist, search_name, needed=BIG_NUMBER):
+        """Fills in saved_artist['full'] from the artist's discography, streamed singles and
+        EPs first (see MusicService.iter_artist_discography), stopping as soon as `needed`
+        distinct tracks are in hand instead of fetching every release.
+
+        saved_artist['full_complete'] records whether the whole discography was read. Until
+        it has been, 'full' holds only the tracks of the releases read so far - its shortest
+        tracks aren't necessarily the artist's shortest. get_artist_track_ids has the
+        refresher read the rest in the background (see refresh_saved_artist), and a partial
+        list a later lookup needs more of than it holds is re-read right then.
+
+        Returns:
+            [str]: The new saved_artist['full'], shortest track first.
+        """
+        tracks = {}
+        complete = True
+        for release in self.service.iter_artist_discography(saved_artist['uri']):
+            for track in self.filter_tracks(search_name, release):
+                tracks.setdefault(track.name, track)
+            if len(tracks) >= needed:
+                complete = False
+                break
+        saved_artist['full'] = [track.id for track in sorted(tracks.values(), key=lambda t: t.duration_ms)]
+        saved_artist['full_complete'] = complete
+        return saved_artist['full']
+
+    def _artist_name_variants(self, artist_name):
+        """artist_name and its alternative spellings (SEARCH_NAME_METHODS), minus any
+        that only differ in case from an earlier one - artist search is case-insensitive
+        on every supported service, so searching those again would return the same results.
+        """
+        variants = []
+        for search_name_method in SEARCH_NAME_METHODS:
+            variant = search_name_method(artist_name)
+            if variant and all(variant.casefold() != v.casefold() for v in variants):
+                variants.append(variant)
+        return variants
+
+    def _score_artist_candidates(self, search_results, variants):
+        """Scores every search result against every name variant at once.
+
+        Returns:
+            (ArtistResult, str) or None, float: The best exact match (a result whose cleaned name
+                equals a cleaned variant, the earliest variant winning) with the variant it matched,
+                and the closest fuzzy similarity (0-1) any result reached to any variant.
+        """
+        cleaned_variants = [self.clean_string(variant) for variant in variants]
+        best_match, best_rank, best_similarity = None, len(variants), 0.0
+        for result in search_results:
+            cleaned_name = self.clean_string(result.name)
+            for rank, cleaned_variant in enumerate(cleaned_variants):
+                if cleaned_name == cleaned_variant:
+                    if rank < best_rank:
+                        best_match, best_rank = (result, variants[rank]), rank
+                    best_similarity = 1.0
+                    break
+                best_similarity = max(best_similarity,
+                                      difflib.SequenceMatcher(None, cleaned_name, cleaned_variant).ratio())
+        return best_match, best_similarity
+
+    @staticmethod
+    def _preferred_index_entry(entry, current):
+        """Whether `entry` should replace `current` in artist_index. An entry is confirmed
+        if it came from a search for its own name - it's then exactly the artist that
+        search resolved to, and beats any entry that isn't, the newer of two confirmed
+        entries winning. Between unconfirmed ones, the better ranked in its search wins
+        and a tie keeps the entry already there.
+        """
+        if entry['confirmed'] or not current.get('confirmed', False):
+            return entry['confirmed'] or entry['rank'] < current.get('rank', BIG_NUMBER)
+        return False
+
+    def add_to_artist_index(self, query, search_results):
+        """Remembers every artist in the response to a search for `query`, under its
+        cleaned name, with its position in the response (its rank) and whether the query
+        was its own name (see _preferred_index_entry). A search only ever contributes its
+        top-ranked artist of each name - the one resolve_artist would pick from it.
+
+        An artist only seen in searches for other names is the same-named artist that
+        ranked highest in any of them, so it isn't necessarily the one a search for its
+        own name would return - but it's only kept until such a search comes along.
+        """
+        cleaned_query = self.clean_string(query)
+        seen = set()
+        for rank, result in enumerate(search_results):
+            name = self.clean_string(result.name)
+            if name in seen:
+                continue
+            seen.add(name)
+            entry = {'id': result.id, 'name': result.name, 'genres': list(result.genres),
+                     'confirmed': name == cleaned_query, 'rank': rank}
+            current = self.artist_index.get(name)
+            if current is None or self._preferred_index_entry(entry, current):
+                self.artist_index[name] = entry
+
+    def resolve_artist(self, artist, searches=None):
+        """Finds artist on the active music service, searching as few times as possible.
+
+        The first search uses the name as is, and its results are scored against every
+        spelling variant at once (see _artist_name_variants), so a result matching e.g. the
+        '&' spelling is accepted without a search of its own. Another variant is searched
+        only after a near miss: no result matched, but one came at least
+        general_settings.search_near_miss_percent similar, suggesting a different spelling
+        might find it. When nothing came close the artist is taken to be unknown to the
+        service and resolution stops after that one search.
+
+        Each variant is looked up in artist_index right before it would be searched, and
+        a hit stands in for the search. A variant that wouldn't be searched isn't looked
+        up either: an indexed 'MIA' is some other artist until a search for 'M.I.A.'
+        comes that close.
+
+        The outcome of those searches is cached (see SearchCache) - including that none of
+        them found the artist, which is remembered for general_settings.search_cache_negative_days.
+        A failed search has no outcome, and is tried again next time.
+
+        Args:
+            artist ([str, int]): The artist's name and play count.
+            searches (list, optional): If given, each search made is appended to it as a
+                (query, results) pair for the caller to add to artist_index later (see
+                get_track_ids), instead of being added right away.
+
+        Returns:
+            (ArtistResult, str): The matched artist, and the variant it matched (its search_name).
+
+        Raises:
+            ArtistNotFoundError: If no search result matched any variant.
+        """
+        cached = self.search_cache.get(artist[0])
+        if cached is not None and cached[0] is not None:
+            return cached
+        variants = self._artist_name_variants(artist[0])
+        for query in variants:
+            indexed = self.artist_index.get(self.clean_string(query))
+            if indexed is not None:
+                return ArtistResult(id=indexed['id'], name=indexed['name'], genres=indexed['genres']), query
+            if cached is not None:
                 raise ArtistNotFoundError(artist)
+            search_results = self.service.search_artist(query)
+            if searches is not None:
+                searches.append((query, search_results))
+            else:
+                self.add_to_artist_index(query, search_results)
+            match, similarity = self._score_artist_candidates(search_results, variants)
+            if match is not None:
+                self.search_cache.put(artist[0], *match)
+                return match
+            if similarity < self.search_near_miss:
+                break
+        self.search_cache.put(artist[0])
+        raise ArtistNotFoundError(artist)
+
+    def _try_get_artist_track_ids(self, artist):
+        """get_artist_track_ids, but returning a PlayListError instead of raising it, so
+        the outcome can be handed over from a worker thread and handled later, in order.
+
+        Returns:
+            ([str] or PlayListError, [(str, [ArtistResult])]): The outcome, and the searches
+                made on the way, not yet added to artist_index (see resolve_artist).
+        """
+        searches = []
+        try:
+            return self.get_artist_track_ids(artist, searches), searches
+        except PlayListError as e:
+            return e, searches
+
+    def _index_searches(self, searches):
+        """Adds the (query, results) pairs _try_get_artist_track_ids returned to artist_index,
+        in order, and empties searches.
+        """
+        for query, search_results in searches:
+            self.add_to_artist_index(query, search_results)
+        searches.clear()
 
     def get_track_ids(self, top_artists, max_entries=500, no_of_old_results=0):
         """Generates a list of track ids from input artist and needed number of plays.
 
+        Artists are looked up general_settings.track_id_lookahead ahead of the one being
+        handled, in worker threads, so their requests overlap with handling it. Outcomes
+        are still handed to the _TrackIdCollector strictly in top_artists order, and what
+        the searches find is only added to artist_index a block (TRACK_ID_BLOCK_SIZE
+        artists) at a time, once every lookup in the block has been handled - so the result
+        (early stop included) is the same whatever the lookahead and however the lookups
+        interleave. Only the lookahead past the point where the playlist fills up is wasted
+        (though cached), its searches unused.
+
         Args:
             top_artists ([ [str, int] ]): An (preferrably) ordered list of pairs of artist names and number of plays.
             max_entries (int, optional): Number of tracks to add to playlist. Defaults to 500.
@@ -552,92 +1338,212 @@ class Playlist_Generator:
         Returns:
             [str]: A list of track ids for the active music service. No longer than max_entries.
         """
-        track_ids = [[], [], [], [], [], [], [], [], [], []]
-        tracks_added = no_of_old_results
-        return_track_ids = []
-        consecutive_search_errors = 0
-        for artist in top_artists:
-            try:
-                temp_tracks = self.get_artist_track_ids(artist)
-                if temp_tracks is None:
-                    print("### I am here ###")
-                    raise ArtistNotFoundError(artist)
-                elif len(temp_tracks):
-                    consecutive_search_errors = 0
-                    if self.verbose:
-                        art_print_string = artist[0] + ":"
-                        if len(artist[0]) < 32:
-                            art_print_string = " " * (8 - (len(artist[0]) + 1) % 8) + art_print_string
-                        while len(art_print_string) < 32:
-                            art_print_string = " " * 8 + art_print_string
-                        art_print_string += f" {len(temp_tracks)} of {artist[1]}"
-                        if len(temp_tracks) < 10:
-                            art_print_string += " "
-                        if artist[1] < 10:
-                            art_print_string += " "
-                        art_print_string += f"\t({tracks_added + len(temp_tracks)}/{max_entries})"
-                        print(art_print_string)
-                    if len(temp_tracks) <= 10:
-                        track_ids[len(temp_tracks) - 1].extend(temp_tracks)
+        collector = _TrackIdCollector(self, max_entries, no_of_old_results)
+        lookahead = self.track_id_lookahead
+        pool = ThreadPoolExecutor(max_workers=lookahead) if lookahead else None
+        in_flight = deque()  # (artist, future, or None without a pool), in top_artists order
+        searches = []  # Made by the lookups handled so far in the current block, in order.
+        submitted = block_end = 0
+        try:
+            while True:
+                if self.deadline_passed():
+                    # Lookups that made it in time still count, in order - only the rest are skipped.
+                    unfinished = len(top_artists) - submitted
+                    for artist, future in in_flight:
+                        if future is None or not future.done():
+                            unfinished += 1
+                            continue
+                        outcome, artist_searches = future.result()
+                        searches.extend(artist_searches)
+                        if collector.add(artist, outcome):
+                            break
                     else:
-                        return_track_ids.extend(temp_tracks)
-                    tracks_added += len(temp_tracks)
-                    if tracks_added >= max_entries:
+                        self.skip_for_deadline(unfinished)
+                    break
+                if not in_flight and submitted == block_end:
+                    self._index_searches(searches)
+                    if submitted == len(top_artists):
                         break
-                else:
-                    raise NoSongsFoundError(artist)
-            except GenreError as e:
-                consecutive_search_errors = 0
-                self.add_skipped_genres(e.genres)
-                continue
-            except SearchError as e:
-                print(f"Some error occurred when searching for {e.artist}")
-                consecutive_search_errors += 1
-                if consecutive_search_errors >= MAX_CONSECUTIVE_SEARCH_ERRORS:
-                    print(f"{MAX_CONSECUTIVE_SEARCH_ERRORS} search errors in a row - "
-                          "stopping early instead of hammering a struggling API.")
+                    block_end = min(len(top_artists), block_end + TRACK_ID_BLOCK_SIZE)
+                while len(in_flight) <= lookahead and submitted < block_end:
+                    artist = top_artists[submitted]
+                    submitted += 1
+                    future = pool.submit(self._try_get_artist_track_ids, artist) if pool is not None else None
+                    in_flight.append((artist, future))
+                artist, future = in_flight.popleft()
+                outcome, artist_searches = (future.result() if future is not None
+                                            else self._try_get_artist_track_ids(artist))
+                searches.extend(artist_searches)
+                if collector.add(artist, outcome):
                     break
-                continue
-            except ArtistNotFoundError:
-                consecutive_search_errors = 0
-                if self.verbose:
-                    print(f'Add {artist[0]} to failed artists')
-                self.remove_list.append(artist[0])
-                self.instance_fail_list.update({artist[0]: max(artist[1], self.instance_fail_list.get(artist[1], 0))})
-                continue
-            except NoSongsFoundError:
-                consecutive_search_errors = 0
-                if self.verbose:
-                    print(f"Found no songs for {artist[0]}.")
-                self.remove_list.append(artist[0])
-                self.instance_no_songs.update({artist[0]: max(artist[1], self.instance_no_songs.get(artist[1], 0))})
-                continue
-            except KeyboardInterrupt:
-                self.do_exit_stuff()
-                raise KeyboardInterrupt
-        ret = []
-        for mini_list in track_ids:
-            ret.extend(mini_list)
-        return ret + return_track_ids
-
-    def should_opp_scrobbles_be_reused(self):
-        if self.stealing_settings['last_opponent_save'] == 0:
+        except KeyboardInterrupt:
+            self.do_exit_stuff()
+            raise KeyboardInterrupt
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            self._index_searches(searches)
+        return collector.track_ids()
+
+    def _get_playlist_track_ids(self, top_artists, max_entries):
+        """Runs get_track_ids over top_artists, after prefetching their last.fm tags.
+
+        Under a deadline (general_settings.max_runtime_seconds), artists already in saved_artists
+        go first - they cost few requests, if any - and the time left goes to the rest. Music
+        service requests that would have to wait past it (for the request budget or a
+        Retry-After) fail with OutOfTimeError meanwhile, and the artist is skipped.
+        """
+        if self.deadline is not None:
+            cached, uncached = [], []
+            for artist in top_artists:
+                (cached if artist[0] in self.saved_artists else uncached).append(artist)
+            top_artists = cached + uncached
+        self.prefetch_lastfm_tags(top_artists)
+        self.rate_limiter.set_deadline(self.service.API_HOST, self.deadline)
+        try:
+            return self.get_track_ids(top_artists, max_entries)
+        finally:
+            self.rate_limiter.set_deadline(self.service.API_HOST, None)
+
+    def start_deadline(self):
+        """Starts the clock for a farm_crowns/steal_crowns run, if general_settings.max_runtime_seconds is set."""
+        max_runtime = self.general_settings['max_runtime_seconds']
+        self.deadline = time.monotonic() + max_runtime if max_runtime else None
+        self.skipped_for_deadline = 0
+
+    def deadline_passed(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def skip_for_deadline(self, candidates):
+        """Records that `candidates` artists were left unlooked-up because the run ran out of time."""
+        self.skipped_for_deadline += candidates
+        if candidates and self.verbose:
+            print(f"Out of time (max_runtime_seconds), stopping with {candidates} candidates left.")
+
+    def report_deadline(self):
+        if self.skipped_for_deadline:
+            print(f"Partial playlist: {self.skipped_for_deadline} candidate artists were skipped "
+                  f"to stay within max_runtime_seconds ({self.general_settings['max_runtime_seconds']}s).")
+
+    def should_opp_scrobbles_be_reused(self, snapshot):
+        """Whether one opponent's cached snapshot can stand in for a fresh download.
+
+        It can't if there is none, if it was fetched for a higher crown_goal than the
+        current one (it would be missing the artists in between), or if it's at least
+        stealing_settings.reuse days old.
+        """
+        if snapshot is None:
             return False
-        elif self.stealing_settings['saved_opponent_goal'] > self.stealing_settings['crown_goal']:
+        elif snapshot['crown_goal'] > self.stealing_settings['crown_goal']:
+            return False
+        elif (time.time() - snapshot['timestamp']) / 86400 >= self.stealing_settings['reuse']:
             return False
-        else:
-            current_day = int(time.strftime('%j'))
-            if self.stealing_settings['last_opponent_save'] > current_day:
-                current_day += 366
-            if current_day >= self.stealing_settings['last_opponent_save'] + self.stealing_settings['reuse']:
-                return False
         return True
 
+    def close(self):
+        """Closes the saved_artists database, and removes the scratch directory an offline run
+        kept its stores in. Call once done with the generator - after the final checkpoint,
+        as anything not saved by then is lost.
+        """
+        self.saved_artists.close()
+        if self._scratch_directory is not None:
+            set_store_directory('')
+            self._scratch_directory.cleanup()
+            self._scratch_directory = None
+
     def do_exit_stuff(self):
         self.make_logs()
         self.save_settings()
         return True
 
+    def update_saved_artist(self, artist_name, saved_artist, journal=True):
+        """Stores an artist's new or changed saved_artists entry, journaling it first - unless
+        the stored entry has a later timestamp, i.e. the refresher replaced it meanwhile.
+
+        Args:
+            journal (bool, optional): False for a change not worth an fsync, which is then only
+                saved at the next checkpoint. Defaults to True.
+
+        Returns:
+            bool: Whether the entry was stored.
+        """
+        with self._saved_artists_lock:
+            stored = self.saved_artists.get(artist_name)
+            if stored is not None and stored.get('timestamp', 0) > saved_artist.get('timestamp', 0):
+                return False
+            if journal:
+                self.journal.append({'name': artist_name, 'entry': saved_artist})
+            self.saved_artists.update({artist_name: saved_artist})
+        return True
+
+    def replay_journal(self):
+        """Moves whatever an interrupted run journaled (see RunJournal) into the stores, so
+        nothing it looked up has to be looked up again.
+
+        The search cache is only saved at the end of a run, so it doesn't know that a
+        recovered failed artist wasn't found - each one is put in as a negative result,
+        which is what keeps it skipped (see _get_skip_artists). One it already has a
+        result for keeps that result, and its expiry.
+
+        Returns:
+            int: The number of journal records replayed.
+        """
+        records = self.journal.read() + self.bad_artist_journal.read()
+        if not records:
+            return 0
+        for record in records:
+            if 'entry' in record:
+                self.saved_artists.update({record['name']: record['entry']})
+            elif 'failed' in record:
+                self.failed_artists.update({record['name']: record['failed']})
+                if self.search_cache.get(record['name']) is None:
+                    self.search_cache.put(record['name'])
+            elif 'no_songs' in record:
+                self.no_song_artists.update({record['name']: record['no_songs']})
+        self.save_local_artist_info()
+        self.save_search_cache()
+        self.save_failed_artists()
+        self.save_no_song_artists()
+        self.journal.clear()
+        self.bad_artist_journal.clear()
+        if self.verbose:
+            print(f"Recovered {len(records)} lookups from an interrupted run.")
+        return len(records)
+
+    def checkpoint(self, final=True):
+        """Saves the saved_artists entries journaled so far to their store, after which
+        those journal records are deleted. Workers can keep journaling meanwhile: their
+        records go to a fresh journal, see RunJournal.rotate.
+
+        Args:
+            final (bool): At the end of a run, the failed and no-song artists, the artist
+                index and the search and album caches are saved as well. Those files are
+                rewritten whole, so the compactions in between (see checkpoint_if_due)
+                leave them be - failed and no-song artists stay in bad_artist_journal until
+                then.
+        """
+        with self._saved_artists_lock:
+            self.journal.rotate()
+        self.save_local_artist_info()
+        self.journal.discard_rotated()
+        if final:
+            self.bad_artist_journal.rotate()
+            self.update_bad_artists()
+            self.save_artist_index()
+            self.save_search_cache()
+            self.save_album_cache()
+            self.save_failed_artists()
+            self.save_no_song_artists()
+            self.bad_artist_journal.discard_rotated()
+        return True
+
+    def checkpoint_if_due(self):
+        """Saves the saved_artists entries (see checkpoint) once journal_compact_every have
+        been journaled since the last time.
+        """
+        if self.journal.length >= self.journal_compact_every:
+            self.checkpoint(final=False)
+
     # List stuff
     def update_bad_artists(self):
         self.failed_artists.update(self.instance_fail_list)
@@ -654,6 +1560,16 @@ class Playlist_Generator:
     def save_local_artist_info(self):
         return save_artist_info(self.saved_artists, self.music_service_name)
 
+    def save_artist_index(self):
+        # A copy, since get_track_ids' worker threads may be adding to it meanwhile.
+        return save_artist_index_to_file(dict(self.artist_index), self.music_service_name)
+
+    def save_search_cache(self):
+        return save_search_cache_to_file(self.search_cache.to_dict(), self.music_service_name)
+
+    def save_album_cache(self):
+        return save_album_cache_to_file(self.service.album_cache.to_dict(), self.music_service_name)
+
     # File stuff
     def save_failed_artists(self):
         return save_failed_artists_to_file(self.failed_artists, self.music_service_name)
@@ -664,7 +1580,9 @@ class Playlist_Generator:
     def make_logs(self):
         dumpfile = {'failed_artist': self.instance_fail_list,
                     'no_songs': self.instance_no_songs,
-                    'skipped genres': self.skipped_genres}
+                    'skipped genres': self.skipped_genres,
+                    'skipped for max_runtime_seconds': self.skipped_for_deadline,
+                    'requests per second': self.rate_limiter.rates()}
         return write_yaml('log.yaml', dumpfile)
 
     def save_settings(self):
@@ -695,6 +1613,7 @@ if __name__ == "__main__":
             print("Finished generating playlist for stealing others crowns successfully.")
         except KeyboardInterrupt:
             print("User aborted generation of list for stealing others crowns.")
+    pg.close()
     if pg.verbose:
         print("Finished run.")
         print("You can close the window or wait for 30 seconds for it to close automatically.")
@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+
+from _library.cassette import Cassette
+from _library.music_services import ArtistResult
+from _library.music_services.fake_service import FakeMusicService, RecordingMusicService
+
+
+class _LiveService:
+    """Stands in for a live MusicService, answering one search."""
+
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def search_artist(self, artist_name):
+        self.queries.append(artist_name)
+        return self.results
+
+
+class RecordingMusicServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cassette = Cassette(directory=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_search_is_passed_through_and_recorded(self):
+        results = [ArtistResult(id='1', name='Massive Attack', genres=['trip hop'])]
+        live = _LiveService(results)
+        recording = RecordingMusicService(live, self.cassette, 'Spotify')
+
+        self.assertEqual(recording.search_artist('Massive Attack'), results)
+        self.assertEqual(live.queries, ['Massive Attack'])
+        self.assertEqual(self.cassette.load('Spotify', ['search_artist', 'Massive Attack']),
+                         [['1', 'Massive Attack', ['trip hop']]])
+
+    def test_recorded_search_is_replayed(self):
+        results = [ArtistResult(id='1', name='Massive Attack', genres=['trip hop'])]
+        RecordingMusicService(_LiveService(results), self.cassette, 'Spotify').search_artist('Massive Attack')
+        fake = FakeMusicService({}, self.cassette, 'Spotify', error_logger=lambda message, printflag=True: None)
+
+        replayed = fake.search_artist('Massive Attack')
+        self.assertEqual([(artist.id, artist.name, list(artist.genres)) for artist in replayed],
+                         [('1', 'Massive Attack', ['trip hop'])])
+        self.assertEqual(fake.search_artist('Portishead'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import tempfile
+import threading
+import unittest
+
+from _library.errors import ArtistNotFoundError
+from _library.file_handler import set_store_directory, store_path, get_search_cache, get_failed_artists
+from _library.journal import RunJournal, journal_filename
+from _library.music_services import SearchCache
+from playlist_generator import Playlist_Generator
+
+MUSIC_SERVICE = 'Spotify'
+
+
+class _Service:
+    """Remembers every search, and finds nothing."""
+
+    def __init__(self):
+        self.queries = []
+
+    def search_artist(self, artist_name):
+        self.queries.append(artist_name)
+        return []
+
+
+def _generator():
+    """A Playlist_Generator with just the stores and journals a run starts with - no config,
+    no last.fm. The stores are read from the current store directory.
+    """
+    generator = Playlist_Generator.__new__(Playlist_Generator)
+    generator.music_service_name = MUSIC_SERVICE
+    generator.verbose = 0
+    generator.service = _Service()
+    generator.saved_artists = {}
+    generator.artist_index = {}
+    generator.failed_artists = get_failed_artists(MUSIC_SERVICE)
+    generator.no_song_artists = {}
+    generator.blacklist_artists = []
+    generator.search_near_miss = 0.8
+    generator.search_cache = SearchCache(get_search_cache(MUSIC_SERVICE))
+    generator.journal = RunJournal(store_path(journal_filename(MUSIC_SERVICE)))
+    generator.bad_artist_journal = RunJournal(store_path(journal_filename(MUSIC_SERVICE, 'bad_artists')))
+    generator._saved_artists_lock = threading.Lock()
+    return generator
+
+
+class JournalRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        set_store_directory(self.directory.name)
+
+    def tearDown(self):
+        set_store_directory('')
+        self.directory.cleanup()
+
+    def test_recovered_failed_artist_isnt_searched_again(self):
+        # What a run that crashed after failing to find the artist leaves behind.
+        crashed = _generator()
+        crashed.bad_artist_journal.append({'name': 'Unknown Two', 'failed': 5})
+
+        recovering = _generator()
+        self.assertEqual(recovering.replay_journal(), 1)
+        self.assertEqual(recovering.failed_artists, {'Unknown Two': 5})
+        self.assertIn('Unknown Two', recovering._get_skip_artists())
+
+        # The recovery is saved, so the run after that doesn't search either.
+        later = _generator()
+        self.assertIn('Unknown Two', later._get_skip_artists())
+        with self.assertRaises(ArtistNotFoundError):
+            later.resolve_artist(['Unknown Two', 5])
+        self.assertEqual(later.service.queries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from _library.errors import ArtistNotFoundError
+from _library.music_services import ArtistResult, SearchCache
+from playlist_generator import Playlist_Generator
+
+
+class _Service:
+    """Answers searches from a dict of query -> results, and remembers every query."""
+
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def search_artist(self, artist_name):
+        self.queries.append(artist_name)
+        return self.results.get(artist_name, [])
+
+
+def _generator(results, artist_index=None):
+    """A Playlist_Generator with just what resolve_artist needs - no config, no last.fm."""
+    generator = Playlist_Generator.__new__(Playlist_Generator)
+    generator.service = _Service(results)
+    generator.search_cache = SearchCache()
+    generator.artist_index = artist_index or {}
+    generator.search_near_miss = 0.8
+    return generator
+
+
+class ResolveArtistTest(unittest.TestCase):
+    def test_own_name_in_index_needs_no_search(self):
+        generator = _generator({}, {'m.i.a.': {'id': '1', 'name': 'M.I.A.', 'genres': [], 'confirmed': False,
+                                               'rank': 3}})
+        match, search_name = generator.resolve_artist(['M.I.A.', 5])
+        self.assertEqual(match.id, '1')
+        self.assertEqual(search_name, 'M.I.A.')
+        self.assertEqual(generator.service.queries, [])
+
+    def test_looser_spelling_in_index_doesnt_replace_the_search(self):
+        mia = ArtistResult(id='2', name='M.I.A.', genres=[])
+        generator = _generator({'M.I.A.': [mia]},
+                               {'mia': {'id': '9', 'name': 'MIA', 'genres': [], 'confirmed': True, 'rank': 0}})
+        match, search_name = generator.resolve_artist(['M.I.A.', 5])
+        self.assertEqual(match.id, '2')
+        self.assertEqual(search_name, 'M.I.A.')
+        self.assertEqual(generator.service.queries, ['M.I.A.'])
+
+    def test_looser_spelling_in_index_stands_in_for_its_search_after_a_near_miss(self):
+        generator = _generator({'M.I.A.': [ArtistResult(id='3', name='M.I.A.s', genres=[])]},
+                               {'mia': {'id': '9', 'name': 'MIA', 'genres': [], 'confirmed': True, 'rank': 0}})
+        match, search_name = generator.resolve_artist(['M.I.A.', 5])
+        self.assertEqual(match.id, '9')
+        self.assertEqual(search_name, 'MIA')
+        self.assertEqual(generator.service.queries, ['M.I.A.'])
+
+    def test_cached_miss_isnt_searched_again(self):
+        generator = _generator({}, {'mia': {'id': '9', 'name': 'MIA', 'genres': [], 'confirmed': True, 'rank': 0}})
+        generator.search_cache.put('M.I.A.')
+        with self.assertRaises(ArtistNotFoundError):
+            generator.resolve_artist(['M.I.A.', 5])
+        self.assertEqual(generator.service.queries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()